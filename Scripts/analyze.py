@@ -0,0 +1,233 @@
+"""Headless batch analysis: run detection, tracking and metrics over videos without Streamlit
+
+    python Scripts/analyze.py footage/ extra_cam.mp4 --output results/
+"""
+import argparse
+import csv
+import functools
+import json
+import os
+import sys
+import time
+
+from detector import VehicleDetector, DETECTION_BACKENDS
+from tracker import TrafficTracker, ASSOCIATION_MODES
+from ring_buffer import retention_frames, RETENTION_SECONDS
+from pipeline import frame_metrics
+from multi_camera import MultiCameraEngine
+from metrics_sink import ColumnarSink, BATCH_METRICS_SCHEMA
+from profiling import RunProfiler, PROFILE_MODES
+from video_processor import probe_video
+import events
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv')
+METRIC_COLUMNS = ['camera'] + [name for name, _ in BATCH_METRICS_SCHEMA]
+OUTPUT_FORMATS = ('csv', 'columnar', 'npz', 'parquet')
+PROGRESS_EVERY = 500
+
+def find_videos(paths, recursive=False):
+    """Video files named directly or found inside the given directories
+
+    Each file is listed once, where it first appears, even when it is named
+    both on its own and through its directory (or through a symlink).
+    """
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            if recursive:
+                walk = ((root, files) for root, _, files in os.walk(path))
+            else:
+                walk = [(path, os.listdir(path))]
+            for root, files in walk:
+                found.extend(os.path.join(root, name) for name in sorted(files)
+                             if name.lower().endswith(VIDEO_EXTENSIONS))
+        elif os.path.isfile(path):
+            found.append(path)
+        else:
+            raise FileNotFoundError(f"No such video or directory: {path}")
+    seen = set()
+    videos = []
+    for video in found:
+        real = os.path.realpath(video)
+        if real not in seen:
+            seen.add(real)
+            videos.append(video)
+    return videos
+
+def camera_ids(videos):
+    """Unique camera id per video, from its file name"""
+    ids = {}
+    for video in videos:
+        name = os.path.splitext(os.path.basename(video))[0]
+        camera_id, n = name, 2
+        while camera_id in ids:
+            camera_id, n = f"{name}_{n}", n + 1
+        ids[camera_id] = video
+    return ids
+
+def history_sizes(sources, retention='1 Hour', skip_frames=3):
+    """Analysed frames each camera keeps under the retention policy, from its probed fps and stride"""
+    return {camera_id: retention_frames(retention, probe_video(path)['fps'], skip_frames)
+            for camera_id, path in sources.items()}
+
+def _scale(value):
+    scale = float(value)
+    if not 0 < scale <= 1:
+        raise argparse.ArgumentTypeError(f"must be in (0, 1], got {value}")
+    return scale
+
+def _roi(value):
+    """``x,y,w,h`` in frame pixels as a detector ROI polygon"""
+    try:
+        x, y, width, height = (int(v) for v in value.split(','))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"must be x,y,w,h in pixels, got {value}") from None
+    if x < 0 or y < 0 or width < 1 or height < 1:
+        raise argparse.ArgumentTypeError(f"needs x, y >= 0 and w, h >= 1, got {value}")
+    x1, y1 = x + width - 1, y + height - 1
+    return [[(x, y), (x1, y), (x1, y1), (x, y1)]]
+
+def _positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return number
+
+class _CsvWriter:
+    def __init__(self, path):
+        self._file = open(path, 'w', newline='')
+        self._writer = csv.DictWriter(self._file, fieldnames=METRIC_COLUMNS, extrasaction='ignore')
+        self._writer.writeheader()
+
+    def append(self, row):
+        self._writer.writerow(row)
+
+    def close(self):
+        self._file.close()
+
+def _metrics_writer(output_dir, camera_id, output_format):
+    if output_format == 'csv':
+        return _CsvWriter(os.path.join(output_dir, f"{camera_id}_metrics.csv"))
+    # Columns stream to <camera>/ in chunks and are memory-mappable with metrics_sink.open_table
+    return ColumnarSink(BATCH_METRICS_SCHEMA, os.path.join(output_dir, camera_id))
+
+def analyze(videos, output_dir, roi=None, backend='threshold', scale=1.0, association='greedy',
+            skip_frames=3, max_frames=None, retention='1 Hour', workers=None,
+            adaptive_signals=True, output_format='csv', profile='off', seed=0):
+    """Analyse every video and write per-camera metrics plus ``summary.json``
+
+    ``csv`` writes ``<camera>_metrics.csv``; ``columnar`` writes typed column
+    files under ``<camera>/``; ``npz`` and ``parquet`` also export those
+    columns to ``<camera>_metrics.npz`` / ``.parquet`` at the end. With
+    ``profile`` set to 'cprofile' or 'sampling' the run's profile is saved
+    in ``output_dir`` and its hottest functions are added to the summary.
+    Simulated classifications and violations are reproducible for a ``seed``
+    (None draws a fresh one). ``roi`` restricts detection to a region, as for
+    ``VehicleDetector``.
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format: {output_format}")
+    os.makedirs(output_dir, exist_ok=True)
+    sources = camera_ids(videos)
+    sizes = history_sizes(sources, retention, skip_frames)
+
+    writers = {}
+    frames = 0
+    profiler = RunProfiler(profile, directory=output_dir, label='analyze')
+    try:
+        for camera_id in sources:
+            writers[camera_id] = _metrics_writer(output_dir, camera_id, output_format)
+
+        with profiler:
+            engine = MultiCameraEngine(
+                sources,
+                detector_factory=functools.partial(VehicleDetector, roi=roi, scale=scale, backend=backend,
+                                                   seed=seed),
+                tracker_factory=functools.partial(TrafficTracker, association=association, seed=seed),
+                workers=workers, skip_frames=skip_frames, max_frames=max_frames, history_sizes=sizes)
+            for camera_id, result in engine.run():
+                row = frame_metrics(result, adaptive_signals)
+                row.update(camera=camera_id, frame_id=result['frame_id'], video_time=result['timestamp'])
+                writers[camera_id].append(row)
+                frames += 1
+                if frames % PROGRESS_EVERY == 0:
+                    print(f"📊 {frames} frames analysed ({engine.wall_seconds:.0f}s)", file=sys.stderr)
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    if output_format in ('npz', 'parquet'):
+        for camera_id, sink in writers.items():
+            path = os.path.join(output_dir, f"{camera_id}_metrics.{output_format}")
+            if output_format == 'npz':
+                sink.to_npz(path)
+            else:
+                sink.to_parquet(path)
+
+    summary = engine.stats()
+    summary['videos'] = sources
+    if profiler.enabled:
+        summary['profile'] = profiler.summary()
+    summary['settings'] = {'roi': roi, 'backend': backend, 'scale': scale, 'association': association,
+                           'skip_frames': skip_frames, 'max_frames': max_frames, 'retention': retention,
+                           'history_sizes': sizes,
+                           'format': output_format, 'profile': profile, 'seed': seed}
+    with open(os.path.join(output_dir, 'summary.json'), 'w') as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch traffic analysis without the dashboard")
+    parser.add_argument("inputs", nargs="+", help="video files and/or directories of videos")
+    parser.add_argument("--output", default="analysis_output", help="directory for metrics files")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default="csv", help="per-frame metrics format")
+    parser.add_argument("--recursive", action="store_true", help="search directories recursively")
+    parser.add_argument("--backend", choices=sorted(DETECTION_BACKENDS), default="threshold")
+    parser.add_argument("--roi", type=_roi, default=None, metavar="X,Y,W,H",
+                        help="detect only inside this rectangle, in frame pixels (default: whole frame)")
+    parser.add_argument("--scale", type=_scale, default=1.0, help="detection downscale factor in (0, 1]")
+    parser.add_argument("--association", choices=ASSOCIATION_MODES, default="greedy")
+    parser.add_argument("--skip-frames", type=_positive_int, default=3, help="analyse every Nth frame")
+    parser.add_argument("--max-frames", type=_positive_int, default=None, help="frames per video (default: all)")
+    parser.add_argument("--retention", choices=list(RETENTION_SECONDS), default="1 Hour")
+    parser.add_argument("--workers", type=_positive_int, default=None, help="detection threads (default: CPU count)")
+    parser.add_argument("--manual-signals", action="store_true", help="disable adaptive signal timing")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seed for simulated classifications and violations (default 0)")
+    parser.add_argument("--log-level", choices=list(events.LEVELS), default="warning",
+                        help="detector/tracker/video events to report (default: warning)")
+    parser.add_argument("--log-file", help="write events as JSON lines to this file instead of stderr")
+    parser.add_argument("--profile", choices=PROFILE_MODES, default="off",
+                        help="save a cProfile or sampling profile of the run to the output directory")
+    args = parser.parse_args(argv)
+
+    try:
+        videos = find_videos(args.inputs, args.recursive)
+    except FileNotFoundError as exc:
+        parser.error(str(exc))
+    if not videos:
+        parser.error("no videos found")
+    events.configure(level=args.log_level,
+                     sink=events.JsonLinesSink(args.log_file) if args.log_file else None)
+    print(f"🚦 Analysing {len(videos)} video(s) into {args.output}")
+    started = time.perf_counter()
+    try:
+        summary = analyze(videos, args.output, roi=args.roi, backend=args.backend,
+                          scale=args.scale, association=args.association, skip_frames=args.skip_frames,
+                          max_frames=args.max_frames, retention=args.retention,
+                          workers=args.workers, adaptive_signals=not args.manual_signals,
+                          output_format=args.format, profile=args.profile,
+                          seed=args.seed)
+    finally:
+        events.LOG.sink.close()
+    for camera_id, stats in summary['cameras'].items():
+        print(f"✅ {camera_id}: {stats['track']['frames']} frames")
+    print(f"✅ {summary['frames']} frames in {time.perf_counter() - started:.1f}s "
+          f"({summary['fps']:.1f} fps)")
+    if 'profile' in summary:
+        print(f"🔍 Profile saved to {summary['profile']['path']}; hottest functions:")
+        for row in summary['profile']['top'][:10]:
+            print(f"   {row['self_pct']:5.1f}%  {row['function']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+import numpy as np
+import events
+
+# Below this many detection/track pairs a full distance matrix beats the grid
+DENSE_LIMIT = 4096
+# Largest contested component (rows or columns) given to solve_dense. The solve
+# grows roughly cubically: about 20 ms at 100, 35 ms at 150 and 300 ms at 500
+COMPONENT_LIMIT = 150
+
+def _dense_pairs(points, targets, radius):
+    diff = points[:, None, :] - targets[None, :, :]
+    dist = np.hypot(diff[..., 0], diff[..., 1])
+    point_idx, target_idx = np.nonzero(dist < radius)
+    return point_idx, target_idx, dist[point_idx, target_idx]
+
+def _grid_pairs(points, targets, radius):
+    """Radius query through a uniform grid with cells one gate wide"""
+    target_cells = np.floor(targets / radius).astype(np.int64)
+    point_cells = np.floor(points / radius).astype(np.int64)
+    low = np.minimum(target_cells.min(axis=0), point_cells.min(axis=0)) - 1
+    stride = max(target_cells[:, 1].max(), point_cells[:, 1].max()) - low[1] + 2
+
+    def cell_key(cells):
+        return (cells[..., 0] - low[0]) * stride + (cells[..., 1] - low[1])
+
+    target_keys = cell_key(target_cells)
+    order = np.argsort(target_keys, kind='stable')
+    sorted_keys = target_keys[order]
+
+    # Every detection looks at its own cell and the 8 around it
+    offsets = np.array([(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)], dtype=np.int64)
+    query_keys = cell_key(point_cells[:, None, :] + offsets[None, :, :]).ravel()
+    lo = np.searchsorted(sorted_keys, query_keys, side='left')
+    hi = np.searchsorted(sorted_keys, query_keys, side='right')
+    counts = hi - lo
+    total = int(counts.sum())
+    if total == 0:
+        empty = np.empty(0, dtype=np.intp)
+        return empty, empty, np.empty(0)
+
+    # Expand the (query, run of matching targets) ranges into flat candidate pairs
+    run_starts = np.repeat(np.cumsum(counts) - counts, counts)
+    within = np.arange(total) - run_starts
+    target_idx = order[np.repeat(lo, counts) + within]
+    point_idx = np.repeat(np.arange(len(query_keys)) // len(offsets), counts)
+
+    diff = points[point_idx] - targets[target_idx]
+    dist = np.hypot(diff[:, 0], diff[:, 1])
+    keep = dist < radius
+    return point_idx[keep], target_idx[keep], dist[keep]
+
+def gated_pairs(points, targets, radius):
+    """All (point index, target index, distance) pairs closer than ``radius``"""
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    targets = np.asarray(targets, dtype=np.float64).reshape(-1, 2)
+    if len(points) == 0 or len(targets) == 0:
+        empty = np.empty(0, dtype=np.intp)
+        return empty, empty, np.empty(0)
+    if len(points) * len(targets) <= DENSE_LIMIT:
+        return _dense_pairs(points, targets, radius)
+    return _grid_pairs(points, targets, radius)
+
+def _nearest_pairs(point_idx, target_idx, dist):
+    """Mask selecting each point's closest pair (ties go to the lower target index)"""
+    order = np.lexsort((target_idx, dist, point_idx))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = point_idx[order][1:] != point_idx[order][:-1]
+    mask = np.zeros(len(order), dtype=bool)
+    mask[order[first]] = True
+    return mask
+
+def greedy_assign(points, targets, radius):
+    """Nearest gated target for each point, or -1
+
+    Each point independently takes its closest target, so several points
+    may share one target.
+    """
+    assignment = np.full(len(points), -1, dtype=np.intp)
+    point_idx, target_idx, dist = gated_pairs(points, targets, radius)
+    if len(point_idx):
+        nearest = _nearest_pairs(point_idx, target_idx, dist)
+        assignment[point_idx[nearest]] = target_idx[nearest]
+    return assignment
+
+def _components(point_idx, target_idx, n_points):
+    """Connected-component label for every gated pair of the bipartite graph"""
+    labels = np.arange(n_points + (target_idx.max() + 1 if len(target_idx) else 0))
+    left, right = point_idx, target_idx + n_points
+    while True:
+        low = np.minimum(labels[left], labels[right])
+        before = labels.copy()
+        np.minimum.at(labels, left, low)
+        np.minimum.at(labels, right, low)
+        labels = labels[labels]  # pointer jumping
+        if np.array_equal(labels, before):
+            break
+    return labels[point_idx]
+
+def _greedy_matching(point_idx, target_idx, dist):
+    """One-to-one matching that accepts the shortest remaining gated pair first"""
+    order = np.lexsort((target_idx, point_idx, dist))
+    taken_points, taken_targets = set(), set()
+    for point, target in zip(point_idx[order].tolist(), target_idx[order].tolist()):
+        if point not in taken_points and target not in taken_targets:
+            taken_points.add(point)
+            taken_targets.add(target)
+            yield point, target
+
+def solve_dense(cost):
+    """Minimum-cost assignment of every row of ``cost`` (rows <= columns)
+
+    Shortest augmenting path Hungarian method (Jonker-Volgenant style dual
+    updates) with the inner column scan vectorized in NumPy. Returns the
+    column chosen for each row.
+    """
+    n, m = cost.shape
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    owner = np.zeros(m + 1, dtype=np.intp)  # 1-based row holding each column, 0 = free
+    way = np.zeros(m + 1, dtype=np.intp)
+    for row in range(1, n + 1):
+        owner[0] = row
+        col = 0
+        min_slack = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[col] = True
+            current = owner[col]
+            free = ~used[1:]
+            slack = cost[current - 1] - u[current] - v[1:]
+            better = free & (slack < min_slack[1:])
+            min_slack[1:][better] = slack[better]
+            way[1:][better] = col
+            candidates = np.where(free, min_slack[1:], np.inf)
+            nxt = int(np.argmin(candidates)) + 1
+            delta = candidates[nxt - 1]
+            used_cols = np.nonzero(used)[0]
+            u[owner[used_cols]] += delta
+            v[used_cols] -= delta
+            min_slack[1:][free] -= delta
+            col = nxt
+            if owner[col] == 0:
+                break
+        # Flip the augmenting path back to the root
+        while col:
+            prev = way[col]
+            owner[col] = owner[prev]
+            col = prev
+    assignment = np.empty(n, dtype=np.intp)
+    cols = np.nonzero(owner[1:])[0]
+    assignment[owner[1:][cols] - 1] = cols
+    return assignment
+
+def optimal_assign(points, targets, radius, component_limit=COMPONENT_LIMIT):
+    """Globally optimal one-to-one gated assignment, -1 for unmatched points
+
+    Minimises total distance plus ``radius`` for every unmatched point. The
+    gated graph is split into connected components; isolated pairs are
+    matched directly and only contested components go to ``solve_dense``.
+    Components larger than ``component_limit`` would take too long to
+    solve exactly; they are matched one-to-one shortest-pair-first instead,
+    with a warning event.
+    """
+    assignment = np.full(len(points), -1, dtype=np.intp)
+    point_idx, target_idx, dist = gated_pairs(points, targets, radius)
+    if len(point_idx) == 0:
+        return assignment
+
+    # Fast path: a point and a target that only see each other
+    point_degree = np.bincount(point_idx, minlength=len(points))
+    target_degree = np.bincount(target_idx)
+    isolated = (point_degree[point_idx] == 1) & (target_degree[target_idx] == 1)
+    assignment[point_idx[isolated]] = target_idx[isolated]
+
+    contested = ~isolated
+    if not contested.any():
+        return assignment
+    point_idx, target_idx, dist = point_idx[contested], target_idx[contested], dist[contested]
+    labels = _components(point_idx, target_idx, len(points))
+
+    # Second fast path: if every point's nearest target is distinct within a
+    # component, each point sits at its own minimum cost, which is optimal
+    nearest = _nearest_pairs(point_idx, target_idx, dist)
+    claims = np.bincount(target_idx[nearest], minlength=target_idx.max() + 1)
+    conflicted = np.unique(labels[nearest & (claims[target_idx] > 1)])
+    settled = ~np.isin(labels, conflicted)
+    accept = settled & nearest
+    assignment[point_idx[accept]] = target_idx[accept]
+    point_idx, target_idx, dist, labels = (point_idx[~settled], target_idx[~settled],
+                                           dist[~settled], labels[~settled])
+    if len(point_idx) == 0:
+        return assignment
+
+    order = np.argsort(labels, kind='stable')
+    bounds = np.flatnonzero(np.diff(labels[order])) + 1
+    for group in np.split(order, bounds):
+        rows, row_of = np.unique(point_idx[group], return_inverse=True)
+        cols, col_of = np.unique(target_idx[group], return_inverse=True)
+        if max(len(rows), len(cols)) > component_limit:
+            events.sampled(events.WARNING, 'association.component_capped', points=len(rows),
+                           targets=len(cols), limit=component_limit)
+            for point, target in _greedy_matching(point_idx[group], target_idx[group], dist[group]):
+                assignment[point] = target
+            continue
+        # Non-gated pairs cost the same as leaving the point unmatched
+        cost = np.full((len(rows), len(cols)), float(radius))
+        cost[row_of, col_of] = dist[group]
+        if len(rows) <= len(cols):
+            chosen = solve_dense(cost)
+            matched = cost[np.arange(len(rows)), chosen] < radius
+            assignment[rows[matched]] = cols[chosen[matched]]
+        else:
+            chosen = solve_dense(cost.T)
+            matched = cost.T[np.arange(len(cols)), chosen] < radius
+            assignment[rows[chosen[matched]]] = cols[matched]
+    return assignment
@@ -0,0 +1,380 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import numpy as np
+import cv2
+
+import events
+from detector import VehicleDetector
+from tracker import TrafficTracker
+from pipeline import AnalysisPipeline, track_frame, frame_metrics
+from metrics_sink import ColumnarSink, METRICS_SCHEMA
+from instrumentation import peak_rss_mb
+
+SAMPLE_FRAME = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "sample_frame.jpg")
+PERCENTILES = (50, 90, 95, 99)
+# Relative slowdown that counts as a regression against a baseline
+DEFAULT_TOLERANCE = 0.25
+# Latency changes smaller than this are timer noise, whatever their relative size
+MIN_DELTA_MS = 0.05
+# Tail percentiles are reported but too noisy on shared machines to gate on
+LOWER_IS_BETTER = ('p50_ms', 'peak_rss_mb')
+HIGHER_IS_BETTER = ('fps',)
+
+def synthetic_frames(count=150, width=1280, height=720, vehicles=12, speed=6.0,
+                     flicker=12.0, seed=0):
+    """Yield BGR frames of bright boxes driving over a noisy, flickering road"""
+    rng = np.random.default_rng(seed)
+    road = np.clip(rng.normal(70, 12, (height, width)), 0, 255).astype(np.float32)
+    lanes = np.linspace(height * 0.15, height * 0.85, max(1, vehicles // 3 + 1))
+    sizes = rng.integers([60, 35], [140, 70], size=(vehicles, 2))
+    starts = rng.uniform(0, width, vehicles)
+    rows = rng.choice(lanes, vehicles)
+    velocity = speed * rng.uniform(0.6, 1.4, vehicles)
+
+    for i in range(count):
+        light = flicker * np.sin(i / 7.0)
+        noise = rng.normal(0, 6, (height, width)).astype(np.float32)
+        gray = np.clip(road + light + noise, 0, 255).astype(np.uint8)
+        for (w, h), x0, y, v in zip(sizes, starts, rows, velocity):
+            x = int((x0 + v * i) % (width + w)) - int(w)
+            cv2.rectangle(gray, (x, int(y)), (x + int(w), int(y) + int(h)), 215, -1)
+        yield cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+
+def sample_frames(count=150, path=SAMPLE_FRAME, width=None, height=None, speed=6.0):
+    """Yield ``sample_frame.jpg`` panning sideways by ``speed`` pixels per frame
+
+    A real street scene gives the detectors realistic texture and contour
+    counts; the pan adds motion for the tracker and background models.
+    """
+    image = cv2.imread(path)
+    if image is None:
+        raise FileNotFoundError(f"Cannot read sample frame: {path}")
+    if width and height:
+        image = cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+    for i in range(count):
+        yield np.roll(image, int(round(speed * i)) % image.shape[1], axis=1)
+
+def _latency_summary(latencies):
+    ms = np.asarray(latencies, dtype=np.float64) * 1000.0
+    if len(ms) == 0:
+        return {'mean_ms': 0.0, 'fps': 0.0}
+    summary = {'mean_ms': float(ms.mean())}
+    for q, value in zip(PERCENTILES, np.percentile(ms, PERCENTILES)):
+        summary[f'p{q}_ms'] = float(value)
+    summary['max_ms'] = float(ms.max())
+    summary['fps'] = float(1000.0 / ms.mean()) if ms.mean() > 0 else 0.0
+    return summary
+
+def benchmark_backend(backend, frames, warmup=30, seed=0):
+    """Per-frame detect latency, box count stability and downstream tracker cost"""
+    detector = VehicleDetector(backend=backend, seed=seed)
+    tracker = TrafficTracker(seed=seed)
+    detect_times = []
+    track_times = []
+    counts = []
+
+    for frame_id, frame in enumerate(frames):
+        start = time.perf_counter()
+        boxes, vehicle_data = detector.detect(frame)
+        detected = time.perf_counter()
+        tracker.update(frame_id, boxes, vehicle_data)
+        tracked = time.perf_counter()
+        # Background models need a few frames to learn the empty road
+        if frame_id >= warmup:
+            detect_times.append(detected - start)
+            track_times.append(tracked - detected)
+            counts.append(len(boxes))
+
+    counts = np.asarray(counts, dtype=np.float64)
+    result = {'backend': backend, 'frames': len(counts)}
+    result.update(_latency_summary(detect_times))
+    result['track_mean_ms'] = float(np.mean(track_times) * 1000.0)
+    result['boxes_mean'] = float(counts.mean())
+    result['boxes_std'] = float(counts.std())
+    # Mean absolute change in box count between consecutive frames
+    result['boxes_jitter'] = float(np.abs(np.diff(counts)).mean()) if len(counts) > 1 else 0.0
+    return result
+
+def compare_backends(frames, backends=('threshold', 'mog2', 'knn'), warmup=30, seed=0):
+    """Run every backend over the same frames"""
+    frames = list(frames)
+    return [benchmark_backend(backend, frames, warmup, seed) for backend in backends]
+
+def synthetic_detections(tracks, frames=20, spacing=150.0, speed=6.0, seed=0):
+    """Per-frame box arrays for ``tracks`` vehicles moving at constant density"""
+    rng = np.random.default_rng(seed)
+    side = spacing * np.sqrt(tracks)
+    centers = rng.uniform(0, side, (tracks, 2))
+    velocity = rng.normal(0, speed, (tracks, 2))
+    half = np.array([35.0, 20.0])
+    for _ in range(frames):
+        yield np.hstack([centers - half, centers + half]).astype(np.int32)
+        centers = centers + velocity
+
+# Vehicle spacing in pixels: 'sparse' keeps tracks apart, 'dense' packs them inside
+# one another's 80 px gate, so 'optimal' association has large contested components
+TRACKER_SCENES = {'sparse': 150.0, 'dense': 40.0}
+
+def benchmark_tracker(track_counts=(10, 50, 100, 500, 1000, 2000), frames=20, warmup=3,
+                      association='greedy', scene='sparse', seed=0):
+    """TrafficTracker.update latency as the number of live tracks grows"""
+    results = []
+    for count in track_counts:
+        tracker = TrafficTracker(association=association, seed=seed)
+        latencies = []
+        detections = synthetic_detections(count, frames + warmup, spacing=TRACKER_SCENES[scene],
+                                          seed=seed)
+        for frame_id, boxes in enumerate(detections):
+            start = time.perf_counter()
+            tracker.update(frame_id, boxes)
+            if frame_id >= warmup:
+                latencies.append(time.perf_counter() - start)
+        result = {'scene': scene, 'association': association, 'tracks': count,
+                  'live_tracks': len(tracker.tracks), 'track_ids': tracker.next_id}
+        result.update(_latency_summary(latencies))
+        results.append(result)
+    return results
+
+def benchmark_stages(frames, backend='threshold', scale=1.0, association='greedy', warmup=10, seed=0):
+    """Per-stage latency of the dashboard's per-frame loop, one frame at a time
+
+    Stages: ``detect`` (detect_frame), ``track`` (history, tracking and
+    queue metrics) and ``metrics`` (the metrics row and its sink append);
+    ``frame`` is their sum.
+    """
+    detector = VehicleDetector(scale=scale, backend=backend, seed=seed)
+    tracker = TrafficTracker(association=association, seed=seed)
+    sink = ColumnarSink(METRICS_SCHEMA)
+    stages = {'detect': [], 'track': [], 'metrics': [], 'frame': []}
+    for index, frame in enumerate(frames):
+        start = time.perf_counter()
+        boxes, vehicle_data = detector.detect_frame(frame)
+        detected = time.perf_counter()
+        result = track_frame(detector, tracker, index, index, index / 30.0, boxes, vehicle_data)
+        tracked = time.perf_counter()
+        row = frame_metrics(result)
+        row['timestamp'] = np.datetime64(index, 'ms')
+        sink.append(row)
+        done = time.perf_counter()
+        if index >= warmup:
+            stages['detect'].append(detected - start)
+            stages['track'].append(tracked - detected)
+            stages['metrics'].append(done - tracked)
+            stages['frame'].append(done - start)
+    results = []
+    for stage, latencies in stages.items():
+        result = {'stage': stage, 'backend': backend, 'frames': len(latencies)}
+        result.update(_latency_summary(latencies))
+        results.append(result)
+    return results
+
+def benchmark_pipeline(frames, backend='threshold', scale=1.0, detect_workers=2, seed=0):
+    """End-to-end AnalysisPipeline throughput and the gap between consecutive results"""
+    pipeline = AnalysisPipeline(VehicleDetector(scale=scale, backend=backend, seed=seed),
+                                TrafficTracker(seed=seed), detect_workers=detect_workers)
+    gaps = []
+    last = time.perf_counter()
+    for result in pipeline.run((i, i / 30.0, frame) for i, frame in enumerate(frames)):
+        frame_metrics(result)
+        now = time.perf_counter()
+        gaps.append(now - last)
+        last = now
+    stats = pipeline.stats()
+    result = {'backend': backend, 'workers': pipeline.detect_workers, 'frames': len(gaps)}
+    result.update(_latency_summary(gaps))
+    # Wall-clock throughput, which includes pipeline start-up and shutdown
+    result['fps'] = stats['fps']
+    return result
+
+def _environment():
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count()
+    }
+
+def _entries(report):
+    """Flatten a report into {name: result} so runs can be compared entry by entry"""
+    entries = {}
+    for row in report.get('tracker', []):
+        # Sparse rows keep their original names, so older baselines still compare
+        scene = row.get('scene', 'sparse')
+        prefix = "tracker" if scene == 'sparse' else f"tracker/{scene}"
+        entries[f"{prefix}/{row['association']}/{row['tracks']}"] = row
+    for row in report.get('detector', []):
+        entries[f"detector/{row['backend']}"] = row
+    for row in report.get('stages', []):
+        entries[f"stage/{row['stage']}"] = row
+    if 'pipeline' in report:
+        entries['pipeline'] = report['pipeline']
+    if report.get('peak_rss_mb') is not None:
+        entries['process'] = {'peak_rss_mb': report['peak_rss_mb']}
+    return entries
+
+def save_baseline(report, path):
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+
+def load_baseline(path):
+    with open(path) as f:
+        return json.load(f)
+
+def _ms_delta(metric, current, baseline):
+    """Latency change in ms behind a metric change (fps is converted back to ms per frame)"""
+    if metric.endswith('_ms'):
+        return current - baseline
+    if metric == 'fps' and current > 0 and baseline > 0:
+        return 1000.0 / current - 1000.0 / baseline
+    return None
+
+def compare_to_baseline(report, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Metrics that got worse than ``baseline`` by more than ``tolerance`` (a fraction)
+
+    Returns (entry, metric, baseline value, current value, relative change)
+    tuples; the change is positive when the current run is worse.
+    """
+    regressions = []
+    current_entries = _entries(report)
+    for name, old in _entries(baseline).items():
+        new = current_entries.get(name)
+        if new is None:
+            continue
+        for metric in LOWER_IS_BETTER + HIGHER_IS_BETTER:
+            if old.get(metric) is None or new.get(metric) is None or old[metric] <= 0:
+                continue
+            if metric in LOWER_IS_BETTER:
+                change = (new[metric] - old[metric]) / old[metric]
+            else:
+                change = (old[metric] - new[metric]) / old[metric]
+            delta_ms = _ms_delta(metric, new[metric], old[metric])
+            if change > tolerance and (delta_ms is None or delta_ms > MIN_DELTA_MS):
+                regressions.append((name, metric, old[metric], new[metric], change))
+    return regressions
+
+def _print_table(rows, columns):
+    print(" | ".join(f"{c:>13}" for c in columns))
+    for row in rows:
+        cells = []
+        for c in columns:
+            value = row[c]
+            cells.append(f"{value:>13.2f}" if isinstance(value, float) else f"{value:>13}")
+        print(" | ".join(cells))
+
+def load_frames(workload='synthetic', frames=150, width=None, height=None, vehicles=12,
+                speed=6.0, seed=0, video=None, image=SAMPLE_FRAME):
+    """Materialise a workload's frames up front so decoding stays out of the timings"""
+    if workload == 'video':
+        from video_processor import iter_frames
+        return [f for _, _, f in iter_frames(video, skip_frames=1, max_frames=frames)]
+    if workload == 'sample':
+        # Native resolution unless a size is given
+        return list(sample_frames(frames, image, width, height, speed=speed))
+    return list(synthetic_frames(frames, width or 1280, height or 720, vehicles, speed, seed=seed))
+
+def run_benchmarks(frames, suite='all', backends=('threshold', 'mog2', 'knn'), seed=0):
+    """Run the selected suites over ``frames``; returns a JSON-ready report
+
+    ``seed`` fixes the tracker scenes and the simulated classifications and
+    violations, so repeated runs do the same work.
+    """
+    report = {}
+    if suite in ('all', 'tracker'):
+        report['tracker'] = (benchmark_tracker(seed=seed) +
+                             benchmark_tracker(association='optimal', seed=seed))
+        # Contested scenes show what the dashboard's "High Accuracy" (optimal) mode costs
+        dense_counts = (100, 500, 2000)
+        report['tracker'] += (benchmark_tracker(dense_counts, scene='dense', seed=seed) +
+                              benchmark_tracker(dense_counts, association='optimal', scene='dense',
+                                                seed=seed))
+    if suite in ('all', 'detector'):
+        report['detector'] = compare_backends(frames, backends, seed=seed)
+    if suite in ('all', 'pipeline'):
+        report['stages'] = benchmark_stages(frames, seed=seed)
+        report['pipeline'] = benchmark_pipeline(frames, seed=seed)
+    report['peak_rss_mb'] = peak_rss_mb()
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Traffic detector benchmarks")
+    parser.add_argument("--workload", choices=["synthetic", "sample", "video"], default="synthetic",
+                        help="synthetic scene, panned sample_frame.jpg, or --video footage")
+    parser.add_argument("--video", help="benchmark on a video (implies --workload video)")
+    parser.add_argument("--image", default=SAMPLE_FRAME, help="still image for --workload sample")
+    parser.add_argument("--frames", type=int, default=150)
+    parser.add_argument("--width", type=int, help="frame width (synthetic default 1280)")
+    parser.add_argument("--height", type=int, help="frame height (synthetic default 720)")
+    parser.add_argument("--vehicles", type=int, default=12)
+    parser.add_argument("--speed", type=float, default=6.0, help="vehicle speed / pan in pixels per frame")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seed for the synthetic scenes and simulated classifications (default 0)")
+    parser.add_argument("--suite", choices=["all", "detector", "tracker", "pipeline"], default="all")
+    parser.add_argument("--save", metavar="JSON", help="write the results as a baseline file")
+    parser.add_argument("--baseline", metavar="JSON", help="compare against a saved baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="relative slowdown flagged as a regression (default 0.25)")
+    args = parser.parse_args(argv)
+    # Only warnings, so start-up events stay out of the result tables
+    events.configure(level='warning')
+    if args.video:
+        args.workload = "video"
+    elif args.workload == "video":
+        parser.error("--workload video needs --video")
+
+    config = {'workload': args.workload, 'frames': args.frames, 'width': args.width,
+              'height': args.height, 'vehicles': args.vehicles, 'speed': args.speed,
+              'seed': args.seed, 'suite': args.suite,
+              'source': args.video or (args.image if args.workload == 'sample' else None)}
+    frames = []
+    if args.suite != "tracker":
+        frames = load_frames(args.workload, args.frames, args.width, args.height, args.vehicles,
+                             args.speed, args.seed, args.video, args.image)
+    report = run_benchmarks(frames, args.suite, seed=args.seed)
+
+    if 'tracker' in report:
+        print("📊 TrafficTracker.update vs track count")
+        _print_table(report['tracker'], ['scene', 'association', 'tracks', 'live_tracks', 'track_ids',
+                                         'mean_ms', 'p50_ms', 'p95_ms', 'p99_ms'])
+    if 'detector' in report:
+        print("📊 Detector backends")
+        _print_table(report['detector'],
+                     ['backend', 'frames', 'mean_ms', 'p95_ms', 'fps', 'track_mean_ms',
+                      'boxes_mean', 'boxes_std', 'boxes_jitter'])
+    if 'stages' in report:
+        print("📊 Per-frame stages (serial)")
+        _print_table(report['stages'], ['stage', 'frames', 'mean_ms', 'p50_ms', 'p90_ms',
+                                        'p95_ms', 'p99_ms', 'max_ms'])
+        print("📊 End-to-end pipeline")
+        _print_table([report['pipeline']], ['backend', 'workers', 'frames', 'fps', 'p50_ms', 'p95_ms'])
+    if report['peak_rss_mb'] is not None:
+        print(f"📊 Peak RSS: {report['peak_rss_mb']:.1f} MB")
+
+    report = {'config': config, 'environment': _environment(), **report}
+    if args.save:
+        save_baseline(report, args.save)
+        print(f"✅ Baseline saved to {args.save}")
+    if args.baseline:
+        baseline = load_baseline(args.baseline)
+        workload = {k: v for k, v in config.items() if k != 'suite'}
+        recorded = {k: v for k, v in baseline.get('config', {}).items() if k != 'suite'}
+        if recorded != workload:
+            # Timings of different workloads say nothing about regressions
+            print(f"❌ Baseline used different workload settings: {recorded}")
+            return 2
+        if baseline.get('environment') != report['environment']:
+            print("⚠️ Baseline was recorded on a different machine or library versions")
+        regressions = compare_to_baseline(report, baseline, args.tolerance)
+        for name, metric, old, new, change in regressions:
+            print(f"❌ {name} {metric}: {old:.3f} -> {new:.3f} ({change:+.0%} worse)")
+        if regressions:
+            return 1
+        print(f"✅ No regressions beyond {args.tolerance:.0%} against {args.baseline}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,83 +1,448 @@
+import os
+import pickle
 import cv2
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from ring_buffer import RingBuffer, DEFAULT_HISTORY
+from running_stats import RunningStats
+import instrumentation
+import events
+from random_streams import FrameStreams
 
-class VehicleDetector:
+# One record per accepted detection; bbox is [x1, y1, x2, y2]
+DETECTION_DTYPE = np.dtype([
+    ('bbox', np.int32, (4,)),
+    ('type_index', np.int8),
+    ('confidence', np.float64),
+    ('area', np.float64),
+    ('aspect_ratio', np.float64)
+])
+
+TYPE_PROBABILITIES = [0.6, 0.15, 0.1, 0.1, 0.05]
+# Upper bounds for drawing a type index from one uniform number
+TYPE_THRESHOLDS = np.cumsum(TYPE_PROBABILITIES)[:-1]
+
+def contour_geometry(contours):
+    """Bounding rects (x, y, w, h) and areas for all contours in bulk
+    
+    Matches cv2.boundingRect / cv2.contourArea exactly, but runs as a few
+    NumPy reductions over the concatenated points instead of a Python loop.
+    """
+    if len(contours) == 0:
+        return np.empty((0, 4), dtype=np.int32), np.empty(0, dtype=np.float64)
+    
+    lengths = np.fromiter((len(c) for c in contours), dtype=np.intp, count=len(contours))
+    starts = np.zeros(len(contours), dtype=np.intp)
+    np.cumsum(lengths[:-1], out=starts[1:])
+    points = np.concatenate(contours).reshape(-1, 2)
+    xs = points[:, 0]
+    ys = points[:, 1]
+    
+    x_min = np.minimum.reduceat(xs, starts)
+    y_min = np.minimum.reduceat(ys, starts)
+    width = np.maximum.reduceat(xs, starts) - x_min + 1
+    height = np.maximum.reduceat(ys, starts) - y_min + 1
+    
+    # Shoelace formula; each contour closes back onto its own first point
+    following = np.arange(1, len(points) + 1)
+    following[starts + lengths - 1] = starts
+    xs = xs.astype(np.float64)
+    ys = ys.astype(np.float64)
+    cross = xs * ys[following] - xs[following] * ys
+    areas = np.abs(np.add.reduceat(cross, starts)) * 0.5
+    
+    rects = np.stack([x_min, y_min, width, height], axis=1).astype(np.int32)
+    return rects, areas
+
+class DetectionBatch:
+    """Per-frame detections as a structured array with parallel attribute views
+    
+    Indexing or iterating still yields the legacy per-vehicle dicts.
+    """
+    def __init__(self, records, vehicle_types):
+        self.records = records
+        self.vehicle_types = vehicle_types
+    
+    @classmethod
+    def empty(cls, vehicle_types):
+        return cls(np.empty(0, dtype=DETECTION_DTYPE), vehicle_types)
+    
+    @property
+    def boxes(self):
+        return self.records['bbox']
+    
+    @property
+    def type_index(self):
+        return self.records['type_index']
+    
+    @property
+    def confidence(self):
+        return self.records['confidence']
+    
+    @property
+    def area(self):
+        return self.records['area']
+    
+    @property
+    def aspect_ratio(self):
+        return self.records['aspect_ratio']
+    
+    @property
+    def types(self):
+        return [self.vehicle_types[i] for i in self.type_index]
+    
+    def __len__(self):
+        return len(self.records)
+    
+    def __getitem__(self, i):
+        record = self.records[i]
+        return {
+            'bbox': record['bbox'].tolist(),
+            'type': self.vehicle_types[record['type_index']],
+            'confidence': float(record['confidence']),
+            'area': float(record['area']),
+            'aspect_ratio': float(record['aspect_ratio'])
+        }
+    
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+# Per-process state for detect_batch workers
+_worker_detectors = {}
+_worker_segment = None
+
+def _detect_shared(config_key, config, shm_name, offset, shape, dtype, frame_key):
+    """Pool task: run detect_frame on a frame that lives in shared memory"""
+    global _worker_segment
+    detector = _worker_detectors.get(config_key)
+    if detector is None:
+        detector = _worker_detectors[config_key] = VehicleDetector(**config)
+    if _worker_segment is None or _worker_segment.name != shm_name:
+        if _worker_segment is not None:
+            _worker_segment.close()
+        _worker_segment = shared_memory.SharedMemory(name=shm_name)
+    frame = np.ndarray(shape, dtype=np.dtype(dtype), buffer=_worker_segment.buf, offset=offset)
+    return detector.detect_frame(frame, frame_key)
+
+class ThresholdBackend:
+    """Single-frame foreground: blur, fixed threshold and gap closing"""
+    stateful = False
+    
     def __init__(self):
-        print("🤖 Advanced AI Vehicle Detector Initializing...")
-        self.vehicle_types = ['car', 'truck', 'bus', 'motorcycle', 'bicycle']
-        self.confidence_threshold = 0.7
-        self.detection_history = []
-        print("✅ AI Detection System READY!")
+        self.kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
     
-    def detect(self, frame):
-        """Enhanced AI-powered vehicle detection with classification"""
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    def foreground(self, image):
+        t = instrumentation.start()
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        t = instrumentation.lap('detect.cvtColor', t)
         
         # Apply advanced preprocessing
         blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+        t = instrumentation.lap('detect.blur', t)
         _, thresh = cv2.threshold(blurred, 100, 255, cv2.THRESH_BINARY)
+        t = instrumentation.lap('detect.threshold', t)
         
         # Morphological operations for better detection
-        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
-        thresh = cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, kernel)
+        mask = cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, self.kernel)
+        instrumentation.lap('detect.morphology', t)
+        return mask
+    
+    def reset(self):
+        pass
+
+class BackgroundSubtractorBackend:
+    """MOG2/KNN foreground whose background model persists across frames
+    
+    Frames must be fed in order, so detectors using it are stateful.
+    """
+    stateful = True
+    
+    def __init__(self, method='mog2', history=500):
+        if method not in ('mog2', 'knn'):
+            raise ValueError(f"Unknown background subtraction method: {method}")
+        self.method = method
+        self.history = history
+        self.open_kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
+        self.close_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (5, 5))
+        self.reset()
+    
+    def reset(self):
+        """Forget the learned background"""
+        if self.method == 'mog2':
+            self.subtractor = cv2.createBackgroundSubtractorMOG2(history=self.history, detectShadows=True)
+        else:
+            self.subtractor = cv2.createBackgroundSubtractorKNN(history=self.history, detectShadows=True)
+    
+    def foreground(self, image):
+        t = instrumentation.start()
+        mask = self.subtractor.apply(image)
+        t = instrumentation.lap('detect.subtract', t)
+        # Shadows are marked 127; keep confident foreground only
+        _, mask = cv2.threshold(mask, 200, 255, cv2.THRESH_BINARY)
+        t = instrumentation.lap('detect.threshold', t)
+        mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, self.open_kernel)
+        mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, self.close_kernel)
+        instrumentation.lap('detect.morphology', t)
+        return mask
+
+DETECTION_BACKENDS = {
+    'threshold': ThresholdBackend,
+    'mog2': lambda: BackgroundSubtractorBackend('mog2'),
+    'knn': lambda: BackgroundSubtractorBackend('knn')
+}
+
+class RegionPlan:
+    """Crop window and scaled ROI mask prepared once per frame size"""
+    def __init__(self, frame_shape, roi, scale):
+        height, width = frame_shape
+        self.x0, self.y0, self.x1, self.y1 = 0, 0, width, height
+        mask = None
+        
+        if isinstance(roi, np.ndarray):
+            if roi.shape[:2] != (height, width):
+                raise ValueError(f"ROI mask shape {roi.shape[:2]} does not match frame {(height, width)}")
+            full_mask = (roi > 0).astype(np.uint8) * 255
+            x, y, w, h = cv2.boundingRect(full_mask)
+            self.x0, self.y0, self.x1, self.y1 = x, y, x + w, y + h
+            mask = full_mask[self.y0:self.y1, self.x0:self.x1]
+        elif roi is not None:
+            polygons = [np.asarray(p, dtype=np.int32).reshape(-1, 2) for p in roi]
+            points = np.concatenate(polygons)
+            self.x0 = int(np.clip(points[:, 0].min(), 0, width))
+            self.y0 = int(np.clip(points[:, 1].min(), 0, height))
+            self.x1 = int(np.clip(points[:, 0].max() + 1, 0, width))
+            self.y1 = int(np.clip(points[:, 1].max() + 1, 0, height))
+            mask = np.zeros((self.y1 - self.y0, self.x1 - self.x0), dtype=np.uint8)
+            offset = np.array([self.x0, self.y0], dtype=np.int32)
+            cv2.fillPoly(mask, [p - offset for p in polygons], 255)
+        
+        crop_w = max(0, self.x1 - self.x0)
+        crop_h = max(0, self.y1 - self.y0)
+        self.size = (max(1, int(round(crop_w * scale))), max(1, int(round(crop_h * scale))))
+        self.empty = crop_w == 0 or crop_h == 0
+        if mask is not None and scale != 1.0 and not self.empty:
+            mask = cv2.resize(mask, self.size, interpolation=cv2.INTER_NEAREST)
+        self.mask = mask
+
+class VehicleDetector:
+    def __init__(self, roi=None, scale=1.0, backend='threshold', history_size=DEFAULT_HISTORY,
+                 seed=None):
+        self.vehicle_types = ['car', 'truck', 'bus', 'motorcycle', 'bicycle']
+        self.confidence_threshold = 0.7
+        # One record per frame, kept for the configured retention window
+        self.detection_history = RingBuffer(history_size, dtype=np.dtype([
+            ('frame_vehicles', np.int32),
+            ('avg_confidence', np.float64),
+            ('type_counts', np.int32, (len(self.vehicle_types),))
+        ]))
+        # Aggregates over the retained history, kept current on every append/evict
+        self._total_detections = 0
+        self._type_totals = np.zeros(len(self.vehicle_types), dtype=np.int64)
+        self._confidence_stats = RunningStats()
+        # ROI: binary mask the size of the frame, or a list of polygons in frame pixels
+        if roi is not None and not isinstance(roi, np.ndarray):
+            roi = [[tuple(int(v) for v in point) for point in polygon] for polygon in roi]
+        if not 0 < scale <= 1.0:
+            raise ValueError(f"scale must be in (0, 1], got {scale}")
+        self.roi = roi
+        self.scale = float(scale)
+        if backend not in DETECTION_BACKENDS:
+            raise ValueError(f"Unknown detection backend: {backend}")
+        self.backend_name = backend
+        self.backend = DETECTION_BACKENDS[backend]()
+        self._plans = {}
+        self._pool = None
+        self._pool_workers = 0
+        # Simulated classification draws, reproducible for a given seed
+        self.seed = seed
+        self.random = FrameStreams(seed)
+        events.emit(events.INFO, 'detector.ready', backend=backend, scale=self.scale,
+                    roi=self.roi is not None, history_size=history_size)
+    
+    def get_config(self):
+        """Constructor arguments that rebuild an equivalent detector"""
+        return {'roi': self.roi, 'scale': self.scale, 'backend': self.backend_name, 'seed': self.seed}
+    
+    def reset(self):
+        """Forget detection history and background state before analysing a new video"""
+        self.detection_history.clear()
+        self._total_detections = 0
+        self._type_totals[:] = 0
+        self._confidence_stats.reset()
+        self.backend.reset()
+        self.random.reset()
+    
+    @property
+    def stateful(self):
+        """True when frames must be detected one at a time, in order"""
+        return self.backend.stateful
+    
+    def _plan(self, frame_shape):
+        plan = self._plans.get(frame_shape)
+        if plan is None:
+            plan = self._plans[frame_shape] = RegionPlan(frame_shape, self.roi, self.scale)
+        return plan
+    
+    def detect(self, frame, frame_key=None):
+        """Enhanced AI-powered vehicle detection with classification"""
+        boxes, vehicle_data = self.detect_frame(frame, frame_key)
+        self.record_detections(boxes, vehicle_data)
+        return boxes, vehicle_data
+    
+    def detect_frame(self, frame, frame_key=None):
+        """Detect vehicles in one frame without touching detection history
+
+        ``frame_key`` (the frame's index in the sequence) selects the frame's
+        random stream, so results do not depend on the order frames are
+        detected in; without it frames take keys 0, 1, 2, ... in call order.
+        """
+        plan = self._plan(frame.shape[:2])
+        if frame_key is None:
+            frame_key = self.random.next_key()
+        if plan.empty:
+            detections = DetectionBatch.empty(self.vehicle_types)
+            return detections.boxes, detections
+        
+        # Only the roadway crop is processed, optionally downscaled
+        image = frame[plan.y0:plan.y1, plan.x0:plan.x1]
+        if self.scale != 1.0:
+            t = instrumentation.start()
+            image = cv2.resize(image, plan.size, interpolation=cv2.INTER_AREA)
+            instrumentation.lap('detect.resize', t)
+        thresh = self.backend.foreground(image)
+        t = instrumentation.start()
+        if plan.mask is not None:
+            cv2.bitwise_and(thresh, plan.mask, dst=thresh)
+            t = instrumentation.lap('detect.roi_mask', t)
         
         contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        t = instrumentation.lap('detect.findContours', t)
+        rects, areas = contour_geometry(contours)
+        x, y, w, h = self._to_frame_coordinates(rects, plan)
+        if self.scale != 1.0:
+            areas = areas / (self.scale * self.scale)
+        aspect_ratio = np.divide(w, h, out=np.zeros(len(rects)), where=h > 0)
         
-        boxes = []
-        vehicle_data = []
+        # Enhanced filtering with AI-like logic, as one mask over all contours
+        keep = ((40 < w) & (w < 300) & (25 < h) & (h < 150) &
+                (areas > 1000) & (0.5 < aspect_ratio) & (aspect_ratio < 3.0))
+        count = int(np.count_nonzero(keep))
         
-        for cnt in contours:
-            x, y, w, h = cv2.boundingRect(cnt)
-            area = cv2.contourArea(cnt)
-            aspect_ratio = w / h if h > 0 else 0
-            
-            # Enhanced filtering with AI-like logic
-            if (40 < w < 300 and 25 < h < 150 and 
-                area > 1000 and 0.5 < aspect_ratio < 3.0):
-                
-                # Simulate AI classification confidence
-                confidence = np.random.uniform(0.75, 0.98)
-                vehicle_type = np.random.choice(self.vehicle_types, 
-                                              p=[0.6, 0.15, 0.1, 0.1, 0.05])
-                
-                boxes.append([x, y, x+w, y+h])
-                vehicle_data.append({
-                    'bbox': [x, y, x+w, y+h],
-                    'type': vehicle_type,
-                    'confidence': confidence,
-                    'area': area,
-                    'aspect_ratio': aspect_ratio
-                })
+        records = np.empty(count, dtype=DETECTION_DTYPE)
+        records['bbox'] = np.stack([x, y, x + w, y + h], axis=1)[keep]
+        records['area'] = areas[keep]
+        records['aspect_ratio'] = aspect_ratio[keep]
+        
+        # Simulate AI classification confidence and type, one draw for the whole frame
+        draws = self.random.generator(frame_key).random((2, count))
+        records['confidence'] = 0.75 + 0.23 * draws[0]
+        records['type_index'] = np.searchsorted(TYPE_THRESHOLDS, draws[1], side='right')
         
+        detections = DetectionBatch(records, self.vehicle_types)
+        instrumentation.lap('detect.filtering', t)
+        return detections.boxes, detections
+    
+    def _to_frame_coordinates(self, rects, plan):
+        """Map (x, y, w, h) from the cropped, scaled image back to full-frame pixels"""
+        x, y, w, h = rects.T
+        if self.scale != 1.0:
+            x1 = np.floor(x / self.scale)
+            y1 = np.floor(y / self.scale)
+            x2 = np.ceil((x + w) / self.scale)
+            y2 = np.ceil((y + h) / self.scale)
+            x, y = x1.astype(np.int32), y1.astype(np.int32)
+            w, h = (x2 - x1).astype(np.int32), (y2 - y1).astype(np.int32)
+        return x + plan.x0, y + plan.y0, w, h
+    
+    def record_detections(self, boxes, vehicle_data):
+        """Append one frame's detections to the history, in frame order"""
         # Store detection history for AI learning simulation
-        self.detection_history.append({
-            'frame_vehicles': len(boxes),
-            'avg_confidence': np.mean([v['confidence'] for v in vehicle_data]) if vehicle_data else 0,
-            'vehicle_types': [v['type'] for v in vehicle_data]
-        })
+        avg_confidence = vehicle_data.confidence.mean() if len(vehicle_data) else 0
+        type_counts = np.bincount(vehicle_data.type_index, minlength=len(self.vehicle_types))
+        evicted = self.detection_history.append((len(boxes), avg_confidence, type_counts))
+        
+        self._total_detections += len(boxes)
+        self._type_totals += type_counts
+        if avg_confidence > 0:
+            self._confidence_stats.add(float(avg_confidence))
+        if evicted is not None:
+            self._total_detections -= int(evicted['frame_vehicles'])
+            self._type_totals -= evicted['type_counts']
+            if evicted['avg_confidence'] > 0:
+                self._confidence_stats.remove(float(evicted['avg_confidence']))
+        
+        # Per-frame, so only every Nth frame is logged, and only at debug level
+        events.sampled(events.DEBUG, 'detector.frame', vehicles=len(boxes), avg_confidence=avg_confidence)
+    
+    def detect_batch(self, frames, workers=None):
+        """Detect vehicles in a batch of frames on a process pool
+        
+        Frames are copied once into a single shared-memory segment instead of
+        being pickled per task. Results come back in input order and the
+        per-frame history is recorded here, in the parent.
+        """
+        frames = list(frames)
+        workers = workers or os.cpu_count() or 1
+        # A background model cannot be split across processes
+        frame_keys = [self.random.next_key() for _ in frames]
+        if workers <= 1 or len(frames) <= 1 or self.stateful:
+            return [self.detect(frame, key) for frame, key in zip(frames, frame_keys)]
         
-        print(f"🎯 AI Detected {len(boxes)} vehicles | Avg Confidence: {np.mean([v['confidence'] for v in vehicle_data]):.2f}" if vehicle_data else f"🎯 AI Detected {len(boxes)} vehicles")
+        layout = []
+        size = 0
+        for frame in frames:
+            layout.append((size, frame.shape, frame.dtype.str))
+            size += frame.nbytes
+        
+        segment = shared_memory.SharedMemory(create=True, size=max(1, size))
+        try:
+            for frame, (offset, shape, dtype) in zip(frames, layout):
+                np.ndarray(shape, dtype=dtype, buffer=segment.buf, offset=offset)[...] = frame
+            
+            pool = self._get_pool(workers)
+            # Workers rebuild the same streams, even when this detector was seeded from the OS
+            config = dict(self.get_config(), seed=self.random.entropy)
+            config_key = pickle.dumps(config)
+            futures = [pool.submit(_detect_shared, config_key, config, segment.name, offset, shape,
+                                   dtype, key)
+                       for (offset, shape, dtype), key in zip(layout, frame_keys)]
+            results = [future.result() for future in futures]
+        finally:
+            segment.close()
+            segment.unlink()
         
-        return np.array(boxes) if boxes else np.array([]), vehicle_data
+        for boxes, vehicle_data in results:
+            self.record_detections(boxes, vehicle_data)
+        return results
+    
+    def _get_pool(self, workers):
+        """Reuse one worker pool across batches so process start-up is paid once"""
+        if self._pool is None or self._pool_workers != workers:
+            self.close()
+            self._pool = ProcessPoolExecutor(max_workers=workers)
+            self._pool_workers = workers
+        return self._pool
+    
+    def close(self):
+        """Shut down the detect_batch worker pool, if one was started"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+            self._pool_workers = 0
     
     def get_detection_stats(self):
         """Get AI detection performance statistics"""
         if not self.detection_history:
             return {}
         
-        total_detections = sum(h['frame_vehicles'] for h in self.detection_history)
-        avg_confidence = np.mean([h['avg_confidence'] for h in self.detection_history if h['avg_confidence'] > 0])
-        
-        # Vehicle type distribution
-        all_types = []
-        for h in self.detection_history:
-            all_types.extend(h['vehicle_types'])
-        
-        type_counts = {vtype: all_types.count(vtype) for vtype in self.vehicle_types}
+        confidence = self._confidence_stats
+        type_counts = {vtype: int(count) for vtype, count in zip(self.vehicle_types, self._type_totals)}
         
         return {
-            'total_detections': total_detections,
-            'avg_confidence': avg_confidence,
+            'total_detections': self._total_detections,
+            'avg_confidence': confidence.mean if confidence.count else float('nan'),
+            'confidence_std': confidence.std,
             'frames_processed': len(self.detection_history),
             'vehicle_distribution': type_counts
         }
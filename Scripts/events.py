@@ -0,0 +1,166 @@
+import json
+import os
+import sys
+import threading
+import time
+
+# Same numbers as the logging module, so levels read the same in either
+DEBUG, INFO, WARNING, ERROR = 10, 20, 30, 40
+LEVEL_NAMES = {DEBUG: 'debug', INFO: 'info', WARNING: 'warning', ERROR: 'error'}
+LEVELS = {name: level for level, name in LEVEL_NAMES.items()}
+# Per-frame events are emitted once every this many occurrences
+DEFAULT_SAMPLE_EVERY = 100
+
+def parse_level(level):
+    """Level number from a number or a name such as 'info'"""
+    if isinstance(level, str):
+        try:
+            return LEVELS[level.strip().lower()]
+        except KeyError:
+            raise ValueError(f"Unknown log level: {level}") from None
+    return int(level)
+
+def _json_default(value):
+    # NumPy scalars and arrays, without importing NumPy here
+    if hasattr(value, 'item') and getattr(value, 'ndim', 1) == 0:
+        return value.item()
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    return str(value)
+
+class JsonLinesSink:
+    """One JSON object per event, appended to a file or written to a stream"""
+    def __init__(self, target):
+        if isinstance(target, (str, os.PathLike)):
+            self._stream = open(target, 'a', buffering=1024 * 1024)
+            self._owned = True
+        else:
+            self._stream = target
+            self._owned = False
+        self._lock = threading.Lock()
+
+    def write(self, record):
+        line = json.dumps(record, default=_json_default, separators=(',', ':')) + "\n"
+        with self._lock:
+            self._stream.write(line)
+
+    def flush(self):
+        with self._lock:
+            self._stream.flush()
+
+    def close(self):
+        self.flush()
+        if self._owned:
+            self._stream.close()
+
+class ConsoleSink:
+    """Readable ``level event key=value ...`` lines, by default on stderr"""
+    def __init__(self, stream=None):
+        self._stream = stream
+        self._lock = threading.Lock()
+
+    def write(self, record):
+        fields = ' '.join(f"{key}={value:.4g}" if isinstance(value, float) else f"{key}={value}"
+                          for key, value in record.items() if key not in ('ts', 'level', 'event', 'thread'))
+        line = f"{record['level'].upper():<7} {record['event']} {fields}".rstrip() + "\n"
+        with self._lock:
+            (self._stream or sys.stderr).write(line)
+
+    def flush(self):
+        (self._stream or sys.stderr).flush()
+
+    def close(self):
+        self.flush()
+
+class EventLog:
+    """Level-gated structured events with 1-in-N sampling for per-frame messages
+
+    Events are a name plus keyword fields; nothing is formatted until an
+    event passes the level check (and, for ``sampled``, the sampling
+    counter), so disabled events cost one comparison.
+    """
+    def __init__(self, level=INFO, sink=None, sample_every=DEFAULT_SAMPLE_EVERY):
+        self.level = parse_level(level)
+        self.sink = sink if sink is not None else ConsoleSink()
+        self.sample_every = max(1, int(sample_every))
+        self._counts = {}
+
+    @classmethod
+    def from_env(cls):
+        """Configured by TRAFFIC_LOG_LEVEL, TRAFFIC_LOG_FILE (JSON lines) and TRAFFIC_LOG_SAMPLE
+
+        Invalid values never stop the importing app: each falls back to its
+        default and is reported as a warning event.
+        """
+        problems = []
+        level = os.environ.get('TRAFFIC_LOG_LEVEL', 'info')
+        try:
+            parse_level(level)
+        except ValueError:
+            problems.append(('TRAFFIC_LOG_LEVEL', level, 'info'))
+            level = INFO
+        sample_every = os.environ.get('TRAFFIC_LOG_SAMPLE', str(DEFAULT_SAMPLE_EVERY))
+        try:
+            sample_every = int(sample_every)
+            if sample_every < 1:
+                raise ValueError(sample_every)
+        except ValueError:
+            problems.append(('TRAFFIC_LOG_SAMPLE', sample_every, DEFAULT_SAMPLE_EVERY))
+            sample_every = DEFAULT_SAMPLE_EVERY
+        path = os.environ.get('TRAFFIC_LOG_FILE')
+        sink = None
+        if path:
+            try:
+                sink = JsonLinesSink(path)
+            except OSError as e:
+                problems.append(('TRAFFIC_LOG_FILE', path, f"stderr ({e.strerror})"))
+        log = cls(level=level, sink=sink, sample_every=sample_every)
+        for variable, value, using in problems:
+            log.emit(WARNING, 'events.invalid_setting', variable=variable, value=value, using=using)
+        return log
+
+    def enabled(self, level):
+        return level >= self.level
+
+    def emit(self, level, event, **fields):
+        if level < self.level:
+            return
+        self._write(level, event, fields)
+
+    def sampled(self, level, event, every=None, **fields):
+        """Emit the first and then every ``every``-th occurrence of ``event``"""
+        if level < self.level:
+            return
+        count = self._counts.get(event, 0)
+        self._counts[event] = count + 1
+        every = every or self.sample_every
+        if count % every:
+            return
+        fields['sample_every'] = every
+        fields['occurrence'] = count + 1
+        self._write(level, event, fields)
+
+    def _write(self, level, event, fields):
+        record = {'ts': time.time(), 'level': LEVEL_NAMES.get(level, str(level)), 'event': event,
+                  'thread': threading.current_thread().name}
+        record.update(fields)
+        self.sink.write(record)
+
+    def configure(self, level=None, sink=None, sample_every=None):
+        """Change the level, sink or sampling rate; the previous sink is flushed"""
+        if level is not None:
+            self.level = parse_level(level)
+        if sink is not None:
+            self.sink.flush()
+            self.sink = sink
+        if sample_every is not None:
+            self.sample_every = max(1, int(sample_every))
+        self._counts.clear()
+
+LOG = EventLog.from_env()
+
+# Module-level shortcuts on the process-wide log
+emit = LOG.emit
+sampled = LOG.sampled
+enabled = LOG.enabled
+configure = LOG.configure
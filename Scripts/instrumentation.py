@@ -0,0 +1,208 @@
+import bisect
+import contextlib
+import os
+import sys
+import threading
+import time
+
+# Latency buckets: 10 per decade from 1 µs to 100 s, in seconds
+BUCKET_EDGES = tuple(10.0 ** (e / 10.0) for e in range(-60, 21))
+# Shortest interval over which process CPU use is recomputed
+CPU_SAMPLE_SECONDS = 0.5
+
+class Histogram:
+    """Log-bucketed latency histogram with exact count, total, min and max"""
+    __slots__ = ('name', 'count', 'total', 'min', 'max', 'buckets', '_lock')
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = float('inf')
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKET_EDGES) + 1)
+
+    def record(self, seconds):
+        bucket = bisect.bisect_right(BUCKET_EDGES, seconds)
+        with self._lock:
+            self.count += 1
+            self.total += seconds
+            if seconds < self.min:
+                self.min = seconds
+            if seconds > self.max:
+                self.max = seconds
+            self.buckets[bucket] += 1
+
+    def percentile(self, q):
+        """Estimated ``q``-th percentile in seconds (bucket midpoint, clamped to min/max)"""
+        if self.count == 0:
+            return 0.0
+        rank = q / 100.0 * self.count
+        seen = 0
+        for bucket, n in enumerate(self.buckets):
+            seen += n
+            if n and seen >= rank:
+                low = BUCKET_EDGES[bucket - 1] if bucket > 0 else self.min
+                high = BUCKET_EDGES[bucket] if bucket < len(BUCKET_EDGES) else self.max
+                return min(max((low * high) ** 0.5, self.min), self.max)
+        return self.max
+
+    def snapshot(self):
+        mean = self.total / self.count if self.count else 0.0
+        return {
+            'count': self.count,
+            'total_ms': self.total * 1000.0,
+            'mean_ms': mean * 1000.0,
+            'min_ms': self.min * 1000.0 if self.count else 0.0,
+            'p50_ms': self.percentile(50) * 1000.0,
+            'p95_ms': self.percentile(95) * 1000.0,
+            'p99_ms': self.percentile(99) * 1000.0,
+            'max_ms': self.max * 1000.0
+        }
+
+    def bucket_counts(self):
+        """(upper edge in ms, count) for every non-empty bucket"""
+        edges = [edge * 1000.0 for edge in BUCKET_EDGES] + [float('inf')]
+        return [(edge, n) for edge, n in zip(edges, self.buckets) if n]
+
+class Registry:
+    """Named latency histograms shared by every thread of the process
+
+    Disabled registries skip the clock reads and bookkeeping entirely, so
+    instrumented code runs at full speed with ``TRAFFIC_INSTRUMENTATION=0``.
+    """
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name):
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(name, Histogram(name))
+        return histogram
+
+    def record(self, name, seconds):
+        if self.enabled:
+            self.histogram(name).record(seconds)
+
+    def start(self):
+        """Clock reading to pass to ``lap`` (0.0 when disabled)"""
+        return time.perf_counter() if self.enabled else 0.0
+
+    def lap(self, name, since):
+        """Record the time since ``since`` under ``name``; returns the new reading"""
+        if not self.enabled:
+            return 0.0
+        now = time.perf_counter()
+        self.histogram(name).record(now - since)
+        return now
+
+    def names(self):
+        return sorted(self._histograms)
+
+    def bucket_counts(self, name):
+        histogram = self._histograms.get(name)
+        return histogram.bucket_counts() if histogram is not None else []
+
+    def snapshot(self):
+        """{name: summary} for every histogram with samples"""
+        return {name: self._histograms[name].snapshot() for name in self.names()
+                if self._histograms[name].count}
+
+    def reset(self):
+        for histogram in list(self._histograms.values()):
+            histogram.reset()
+
+REGISTRY = Registry(enabled=os.environ.get('TRAFFIC_INSTRUMENTATION', '1') != '0')
+
+_local = threading.local()
+
+def current():
+    """The registry this thread records into: one installed here, else the process-wide one"""
+    return getattr(_local, 'registry', None) or REGISTRY
+
+def install(registry):
+    """Make ``registry`` the calling thread's registry (for worker threads and pool initializers)"""
+    _local.registry = registry
+
+@contextlib.contextmanager
+def use(registry):
+    """Record into ``registry`` on this thread for the duration of the block
+
+    Pipelines started inside the block install the same registry in their
+    worker threads, so one dashboard session's timings stay in its own
+    registry and never mix with another session's.
+    """
+    previous = getattr(_local, 'registry', None)
+    _local.registry = registry
+    try:
+        yield registry
+    finally:
+        _local.registry = previous
+
+# Module-level shortcuts on the calling thread's registry, for hot paths
+def start():
+    return current().start()
+
+def lap(name, since):
+    return current().lap(name, since)
+
+def record(name, seconds):
+    current().record(name, seconds)
+
+def snapshot():
+    return current().snapshot()
+
+def bucket_counts(name):
+    return current().bucket_counts(name)
+
+def reset():
+    current().reset()
+
+def set_enabled(enabled):
+    current().enabled = bool(enabled)
+
+def is_enabled():
+    return current().enabled
+
+_cpu_sample = (time.perf_counter(), time.process_time(), 0.0)
+_cpu_lock = threading.Lock()
+
+def process_usage():
+    """Process CPU use (percent of one core, over the last interval) and memory
+
+    ``rss_mb`` is the current resident set on Linux and the peak elsewhere;
+    either may be None where the platform offers no way to read it.
+    """
+    global _cpu_sample
+    with _cpu_lock:
+        wall, cpu, percent = _cpu_sample
+        now_wall, now_cpu = time.perf_counter(), time.process_time()
+        if now_wall - wall >= CPU_SAMPLE_SECONDS:
+            percent = 100.0 * (now_cpu - cpu) / (now_wall - wall)
+            _cpu_sample = (now_wall, now_cpu, percent)
+    return {'cpu_percent': percent, 'rss_mb': rss_mb(), 'cpus': os.cpu_count()}
+
+def rss_mb():
+    """Resident set size of this process now, or its peak where only that is known"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024.0 * 1024.0)
+    except (OSError, ValueError, AttributeError):
+        return peak_rss_mb()
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far (None where unsupported)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024.0 * 1024.0) if sys.platform == 'darwin' else peak / 1024.0
@@ -0,0 +1,226 @@
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+
+# Column kinds are NumPy dtype strings, or 'category' for strings stored as int16 codes
+METRICS_SCHEMA = [
+    ('frame', 'i4'), ('vehicles', 'i4'), ('tracks', 'i4'), ('queue_length', 'i4'),
+    ('density', 'f8'), ('congestion_level', 'f8'), ('predicted_wait', 'f8'),
+    ('signal_timing', 'category'), ('avg_queue_speed', 'f8'), ('timestamp', 'datetime64[ms]')
+]
+VIOLATIONS_SCHEMA = [('frame', 'i4'), ('type', 'category'), ('confidence', 'f8')]
+SIGNALS_SCHEMA = [('frame', 'i4'), ('signal_state', 'category'), ('timing', 'category')]
+DETECTIONS_SCHEMA = [('frame', 'i4'), ('x1', 'i4'), ('y1', 'i4'), ('x2', 'i4'), ('y2', 'i4'),
+                     ('vehicle_type', 'category'), ('confidence', 'f8')]
+TRACKS_SCHEMA = [('frame', 'i4'), ('track_id', 'i8'), ('x1', 'i4'), ('y1', 'i4'), ('x2', 'i4'),
+                 ('y2', 'i4'), ('speed', 'f8'), ('vehicle_type', 'category')]
+# Headless runs key rows by source frame and video time instead of wall-clock time
+BATCH_METRICS_SCHEMA = [('frame', 'i4'), ('frame_id', 'i8'), ('video_time', 'f8')] + [
+    column for column in METRICS_SCHEMA if column[0] not in ('frame', 'timestamp')
+]
+
+CATEGORY_DTYPE = np.int16
+CHUNK_ROWS = 4096
+MANIFEST = 'manifest.json'
+
+def _storage_dtype(kind):
+    return np.dtype(CATEGORY_DTYPE) if kind == 'category' else np.dtype(kind)
+
+class _ColumnarData:
+    """Shared read side: typed columns plus category labels
+
+    Subclasses set ``schema`` and ``categories`` and provide ``column(name)``.
+    """
+    def columns(self):
+        return {name: self.column(name) for name, _ in self.schema}
+
+    def to_frame(self, categorical=True):
+        """pandas DataFrame; categorical columns decode to pd.Categorical or plain strings"""
+        import pandas as pd
+        data = {}
+        for name, kind in self.schema:
+            values = self.column(name)
+            if kind == 'category':
+                labels = self.categories[name]
+                if categorical:
+                    values = pd.Categorical.from_codes(values, categories=labels)
+                else:
+                    values = np.asarray(labels, dtype=object)[values] if labels else values.astype(object)
+            data[name] = values
+        return pd.DataFrame(data, columns=[name for name, _ in self.schema])
+
+    def to_npz(self, path):
+        """Compressed NPZ: one array per column plus ``<name>__categories`` labels"""
+        arrays = self.columns()
+        for name, labels in self.categories.items():
+            arrays[f"{name}__categories"] = np.asarray(labels, dtype=str)
+        np.savez_compressed(path, **arrays)
+
+    def to_parquet(self, path):
+        """Parquet via pyarrow (optional dependency); categories become dictionary columns"""
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as exc:
+            raise ImportError("Parquet output needs pyarrow: pip install pyarrow") from exc
+        arrays = {}
+        for name, kind in self.schema:
+            values = self.column(name)
+            if kind == 'category':
+                arrays[name] = pa.DictionaryArray.from_arrays(values, pa.array(self.categories[name], pa.string()))
+            else:
+                arrays[name] = pa.array(values)
+        pq.write_table(pa.table(arrays), path)
+
+class ColumnarSink(_ColumnarData):
+    """Append-only typed columns filled through a preallocated chunk
+
+    Rows land in a fixed-size structured array; when it fills, the chunk is
+    flushed, either kept in memory or (with ``directory``) appended to one
+    raw ``<column>.bin`` file per column next to a JSON manifest, which
+    ``open_table`` memory-maps back without re-reading the video.
+    """
+    def __init__(self, schema, directory=None, chunk_rows=CHUNK_ROWS):
+        self.schema = [(name, kind) for name, kind in schema]
+        self.categories = {name: [] for name, kind in self.schema if kind == 'category'}
+        self._codes = {name: {} for name in self.categories}
+        self._dtype = np.dtype([(name, _storage_dtype(kind)) for name, kind in self.schema])
+        self._chunk = np.zeros(max(1, int(chunk_rows)), dtype=self._dtype)
+        self._filled = 0
+        self._chunks = []
+        self.rows_flushed = 0
+        self.directory = directory
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            for name, _ in self.schema:
+                open(self._column_path(name), 'wb').close()
+            self._write_manifest()
+
+    def _column_path(self, name):
+        return os.path.join(self.directory, f"{name}.bin")
+
+    def _write_manifest(self):
+        manifest = {
+            'schema': self.schema,
+            'rows': self.rows_flushed,
+            'categories': self.categories
+        }
+        tmp = os.path.join(self.directory, MANIFEST + '.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(manifest, f)
+        # A reader never sees a manifest that claims unwritten rows
+        os.replace(tmp, os.path.join(self.directory, MANIFEST))
+
+    def _encode(self, name, value):
+        codes = self._codes[name]
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(codes)
+            self.categories[name].append(value)
+        return code
+
+    def append(self, row):
+        """Add one row given as a dict keyed by column name"""
+        values = []
+        for name, kind in self.schema:
+            value = row[name]
+            if kind == 'category':
+                value = self._encode(name, str(value))
+            elif isinstance(value, datetime):
+                value = np.datetime64(value, 'ms')
+            values.append(value)
+        self._chunk[self._filled] = tuple(values)
+        self._filled += 1
+        if self._filled == len(self._chunk):
+            self.flush()
+
+    def extend(self, columns):
+        """Add many rows at once from equal-length arrays keyed by column name"""
+        encoded = {}
+        for name, kind in self.schema:
+            values = columns[name]
+            if kind == 'category':
+                labels, inverse = np.unique(np.asarray(values, dtype=str), return_inverse=True)
+                codes = np.array([self._encode(name, str(label)) for label in labels], dtype=CATEGORY_DTYPE)
+                values = codes[inverse.reshape(-1)]
+            encoded[name] = np.asarray(values)
+        count = len(encoded[self.schema[0][0]]) if self.schema else 0
+        start = 0
+        while start < count:
+            take = min(count - start, len(self._chunk) - self._filled)
+            part = self._chunk[self._filled:self._filled + take]
+            for name, values in encoded.items():
+                part[name] = values[start:start + take]
+            self._filled += take
+            start += take
+            if self._filled == len(self._chunk):
+                self.flush()
+
+    def flush(self):
+        """Move the filled part of the current chunk to storage"""
+        if self._filled == 0:
+            return
+        part = self._chunk[:self._filled]
+        if self.directory:
+            for name, _ in self.schema:
+                with open(self._column_path(name), 'ab') as f:
+                    np.ascontiguousarray(part[name]).tofile(f)
+        else:
+            self._chunks.append(part.copy())
+        self.rows_flushed += self._filled
+        self._filled = 0
+        if self.directory:
+            self._write_manifest()
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.rows_flushed + self._filled
+
+    def column(self, name):
+        live = self._chunk[name][:self._filled]
+        if self.directory:
+            stored = [np.memmap(self._column_path(name), dtype=live.dtype, mode='r',
+                                shape=(self.rows_flushed,))] if self.rows_flushed else []
+        else:
+            stored = [chunk[name] for chunk in self._chunks]
+        return np.concatenate(stored + [live]) if stored else live.copy()
+
+class ColumnarTable(_ColumnarData):
+    """Read-only view of a flushed sink directory; columns are memory-mapped"""
+    def __init__(self, directory):
+        with open(os.path.join(directory, MANIFEST)) as f:
+            manifest = json.load(f)
+        self.directory = directory
+        self.schema = [tuple(column) for column in manifest['schema']]
+        self.categories = manifest['categories']
+        self.rows = manifest['rows']
+        self._columns = {}
+        for name, kind in self.schema:
+            dtype = _storage_dtype(kind)
+            if self.rows:
+                self._columns[name] = np.memmap(os.path.join(directory, f"{name}.bin"),
+                                                dtype=dtype, mode='r', shape=(self.rows,))
+            else:
+                self._columns[name] = np.empty(0, dtype=dtype)
+
+    def __len__(self):
+        return self.rows
+
+    def column(self, name):
+        return self._columns[name]
+
+def open_table(directory):
+    """Reload a sink directory written by ``ColumnarSink`` (None if there is none)"""
+    if not os.path.exists(os.path.join(directory, MANIFEST)):
+        return None
+    return ColumnarTable(directory)
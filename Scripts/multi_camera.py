@@ -0,0 +1,169 @@
+import math
+import os
+import queue
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import instrumentation
+from pipeline import AnalysisPipeline, FrameDecoder
+
+class _Camera:
+    """Per-source state: isolated detector/tracker pipeline, decoder and in-flight frames"""
+    def __init__(self, camera_id, pipeline, frames, queue_size, max_in_flight):
+        self.camera_id = camera_id
+        self.pipeline = pipeline
+        self.frames = frames
+        self.queue_size = queue_size
+        self.pending = deque()
+        self.max_in_flight = max_in_flight
+        self.finished = False
+        self.error = None
+        self.decoder = None
+
+    @property
+    def done(self):
+        return self.finished and not self.pending
+
+class MultiCameraEngine:
+    """Analyse many video sources at once on one shared detection pool
+
+    Every camera gets its own ``VehicleDetector`` and ``TrafficTracker`` (so
+    tracks, histories and background models never mix) and its own decoder
+    thread feeding a bounded queue. The scheduler takes at most one frame
+    per camera per round-robin pass, each pass starting after the camera fed
+    last, and caps each camera's in-flight frames at its share of the pool
+    (one for stateful detectors, which must see frames in order), so a fast
+    or long source cannot starve the others. Tracking runs on the
+    caller's thread in per-camera frame order, so each camera's results
+    match a standalone ``AnalysisPipeline``. ``queue_size`` bounds each
+    camera's decoded-frame queue only; it does not limit how many of the
+    camera's frames the pool detects at once. ``history_sizes`` maps camera
+    ids to the ``history_size`` passed to that camera's factories.
+    """
+    def __init__(self, sources, detector_factory=None, tracker_factory=None,
+                 workers=None, queue_size=4, skip_frames=3, max_frames=None, history_sizes=None):
+        if detector_factory is None:
+            from detector import VehicleDetector
+            detector_factory = VehicleDetector
+        if tracker_factory is None:
+            from tracker import TrafficTracker
+            tracker_factory = TrafficTracker
+        if not isinstance(sources, dict):
+            sources = {self._camera_name(source, i): source for i, source in enumerate(sources)}
+
+        self.workers = max(1, int(workers or os.cpu_count() or 1))
+        self.queue_size = max(1, int(queue_size))
+        # Keeps every worker busy while leaving room for quiet cameras to get a turn
+        self.max_in_flight = self.workers + len(sources)
+        share = math.ceil(self.max_in_flight / max(1, len(sources)))
+        self.cameras = {}
+        for camera_id, source in sources.items():
+            if isinstance(source, (str, os.PathLike)):
+                from video_processor import iter_frames
+                source = iter_frames(os.fspath(source), skip_frames=skip_frames, max_frames=max_frames)
+            sizing = {} if history_sizes is None else {'history_size': history_sizes[camera_id]}
+            pipeline = AnalysisPipeline(detector_factory(**sizing), tracker_factory(**sizing),
+                                        detect_workers=1, queue_size=self.queue_size)
+            stateful = getattr(pipeline.detector, 'stateful', False)
+            self.cameras[camera_id] = _Camera(camera_id, pipeline, source, self.queue_size,
+                                              1 if stateful else share)
+        self.wall_seconds = 0.0
+
+    @staticmethod
+    def _camera_name(source, index):
+        if isinstance(source, (str, os.PathLike)):
+            return os.path.splitext(os.path.basename(os.fspath(source)))[0]
+        return f"camera_{index}"
+
+    def stats(self):
+        """Per-camera stage stats plus aggregate frames per second"""
+        cameras = {camera_id: cam.pipeline.stats() for camera_id, cam in self.cameras.items()}
+        frames = sum(cam.pipeline.counters['track'].frames for cam in self.cameras.values())
+        return {
+            'cameras': cameras,
+            'frames': frames,
+            'wall_seconds': self.wall_seconds,
+            'fps': frames / self.wall_seconds if self.wall_seconds > 0 else 0.0
+        }
+
+    def _feed(self, camera, executor, block):
+        """Move at most one decoded frame of ``camera`` onto the pool; True if it did"""
+        if camera.finished or len(camera.pending) >= camera.max_in_flight:
+            return False
+        try:
+            item = camera.decoder.get(block=block, timeout=0.05 if block else None)
+        except queue.Empty:
+            return False
+        except BaseException as exc:
+            # Only this camera stops; its frames decoded before the error still finish
+            camera.error = exc
+            camera.finished = True
+            return True
+        if item is None:
+            camera.finished = True
+        else:
+            camera.pending.append(executor.submit(camera.pipeline.detect, item))
+        return True
+
+    def run(self):
+        """Yield ``(camera_id, result)`` for every analysed frame of every source
+
+        Results interleave across cameras in completion order; within one
+        camera they arrive in frame order (``result['index']``). A source that
+        fails to decode stops only its own camera: its earlier frames and the
+        other cameras' frames are still yielded, then the first error is
+        raised, as ``AnalysisPipeline.run`` does for a single source.
+        """
+        started = time.perf_counter()
+        cameras = list(self.cameras.values())
+        # Worker threads time their stages into the caller's registry
+        registry = instrumentation.current()
+        for cam in cameras:
+            cam.decoder = FrameDecoder(cam.pipeline.decode(cam.frames), cam.queue_size,
+                                       name=f"camera-decode-{cam.camera_id}").start()
+        executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="camera-detect",
+                                      initializer=instrumentation.install, initargs=(registry,))
+        # Round-robin cursor: the camera each feeding pass starts with
+        cursor = 0
+        try:
+            while not all(cam.done for cam in cameras):
+                progressed = False
+                in_flight = sum(len(cam.pending) for cam in cameras)
+                for offset in range(len(cameras)):
+                    if in_flight >= self.max_in_flight:
+                        break
+                    position = (cursor + offset) % len(cameras)
+                    if self._feed(cameras[position], executor, block=False):
+                        progressed = True
+                        in_flight += 1
+                        fed = position
+                if progressed:
+                    cursor = (fed + 1) % len(cameras)
+
+                for cam in cameras:
+                    while cam.pending and cam.pending[0].done():
+                        yield cam.camera_id, cam.pipeline.track(cam.pending.popleft().result())
+                        progressed = True
+
+                if progressed:
+                    continue
+                heads = [cam.pending[0] for cam in cameras if cam.pending]
+                if heads:
+                    wait(heads, timeout=0.05, return_when=FIRST_COMPLETED)
+                else:
+                    # Nothing in flight: wait on a camera that still has frames coming
+                    waiting = next(cam for cam in cameras if not cam.finished)
+                    self._feed(waiting, executor, block=True)
+            errors = [cam.error for cam in cameras if cam.error is not None]
+            if errors:
+                raise errors[0]
+        finally:
+            for cam in cameras:
+                if cam.decoder is not None:
+                    cam.decoder.close()
+            executor.shutdown(wait=True, cancel_futures=True)
+            elapsed = time.perf_counter() - started
+            self.wall_seconds += elapsed
+            for cam in cameras:
+                cam.pipeline.wall_seconds += elapsed
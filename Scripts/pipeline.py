@@ -0,0 +1,258 @@
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import instrumentation
+
+_END = object()
+
+class StageCounter:
+    """Frames handled and busy time for one pipeline stage
+
+    Each sample also feeds the stage's latency histogram in ``instrumentation``.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.frames = 0
+        self.busy_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        instrumentation.record(self.name, seconds)
+        with self._lock:
+            self.frames += 1
+            self.busy_seconds += seconds
+
+    def snapshot(self):
+        return {
+            'frames': self.frames,
+            'busy_seconds': self.busy_seconds,
+            'fps': self.frames / self.busy_seconds if self.busy_seconds > 0 else 0.0
+        }
+
+def track_frame(detector, tracker, index, frame_id, timestamp, boxes, vehicle_data):
+    """Ordered stage: history, tracking and queue metrics for one detected frame"""
+    detector.record_detections(boxes, vehicle_data)
+    tracks = tracker.update(index, boxes, vehicle_data)
+    queue_len, density, avg_queue_speed = tracker.get_queue_metrics()
+    return {
+        'index': index,
+        'frame_id': frame_id,
+        'timestamp': timestamp,
+        'boxes': boxes,
+        'vehicle_data': vehicle_data,
+        'tracks': tracks,
+        'queue_length': queue_len,
+        'density': density,
+        'avg_queue_speed': avg_queue_speed
+    }
+
+def signal_timing_for(congestion_level, adaptive=True):
+    """Signal plan the controller would pick for a congestion level (0-100)"""
+    if not adaptive:
+        return "MANUAL CONTROL"
+    if congestion_level > 70:
+        return "EXTENDED GREEN"
+    if congestion_level < 30:
+        return "NORMAL CYCLE"
+    return "ADAPTIVE TIMING"
+
+def frame_metrics(result, adaptive_signals=True):
+    """Traffic metrics row for one pipeline result (shared by the dashboard and the CLI)"""
+    congestion_level = min(100, result['density'] * 10)
+    return {
+        'frame': result['index'],
+        'vehicles': len(result['boxes']),
+        'tracks': len(result['tracks']),
+        'queue_length': result['queue_length'],
+        'density': result['density'],
+        'congestion_level': congestion_level,
+        'predicted_wait': result['queue_length'] * 2.5,
+        'signal_timing': signal_timing_for(congestion_level, adaptive_signals),
+        'avg_queue_speed': result['avg_queue_speed']
+    }
+
+def run_serial(detector, tracker, frames):
+    """Reference single-threaded path: decode, detect and track one frame at a time"""
+    for index, (frame_id, timestamp, frame) in enumerate(frames):
+        boxes, vehicle_data = detector.detect_frame(frame, index)
+        yield track_frame(detector, tracker, index, frame_id, timestamp, boxes, vehicle_data)
+
+class FrameDecoder:
+    """Producer thread that moves decoded items into a bounded queue
+
+    ``get`` returns the next item, or ``None`` once ``items`` is exhausted,
+    and re-raises a decode error on the consumer's thread. ``close`` stops
+    the thread (even while it is blocked on a full queue) and closes
+    ``items``, which releases the capture when the consumer stops early.
+    """
+    def __init__(self, items, queue_size=8, name="pipeline-decode"):
+        self.items = items
+        self._queue = queue.Queue(maxsize=max(1, int(queue_size)))
+        self._stop = threading.Event()
+        # The decode thread times its stage into the caller's registry
+        self._thread = threading.Thread(target=self._produce, args=(instrumentation.current(),),
+                                        name=name, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _produce(self, registry):
+        instrumentation.install(registry)
+        iterator = iter(self.items)
+        try:
+            for item in iterator:
+                while not self._stop.is_set():
+                    try:
+                        self._queue.put(item, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                if self._stop.is_set():
+                    break
+        except BaseException as exc:  # surfaced to the consumer
+            self._queue.put(exc)
+            return
+        finally:
+            if hasattr(iterator, 'close'):
+                iterator.close()
+        self._queue.put(_END)
+
+    def get(self, block=True, timeout=None):
+        """Next item, ``None`` at the end of the source; raises ``queue.Empty`` if none is ready"""
+        item = self._queue.get(block=block, timeout=timeout)
+        if item is _END:
+            return None
+        if isinstance(item, BaseException):
+            raise item
+        return item
+
+    def close(self):
+        self._stop.set()
+        # Keep draining so a producer blocked on a full queue can exit
+        while self._thread.is_alive():
+            try:
+                while True:
+                    self._queue.get_nowait()
+            except queue.Empty:
+                pass
+            self._thread.join(timeout=0.05)
+
+class AnalysisPipeline:
+    """Overlaps decode, detection and tracking across threads
+
+    A decoder thread fills a bounded queue, a pool of detector threads runs
+    ``detect_frame`` (OpenCV releases the GIL inside its kernels) and the
+    caller's thread applies detection history and tracking strictly in frame
+    order, so results match ``run_serial``.
+
+    ``decode``, ``detect`` and ``track`` are the per-frame stages ``run`` is
+    built from, for schedulers such as ``MultiCameraEngine`` that drive
+    several pipelines from one pool.
+    """
+    def __init__(self, detector, tracker, detect_workers=2, queue_size=8):
+        self.detector = detector
+        self.tracker = tracker
+        self.detect_workers = max(0, int(detect_workers))
+        if getattr(detector, 'stateful', False):
+            # One FIFO worker keeps a background model fed in frame order
+            self.detect_workers = min(self.detect_workers, 1)
+        self.queue_size = max(1, int(queue_size))
+        self.counters = {name: StageCounter(name) for name in ('decode', 'detect', 'track')}
+        self.wall_seconds = 0.0
+
+    def stats(self):
+        """Per-stage throughput plus end-to-end frames per second"""
+        stats = {name: counter.snapshot() for name, counter in self.counters.items()}
+        frames = self.counters['track'].frames
+        stats['wall_seconds'] = self.wall_seconds
+        stats['fps'] = frames / self.wall_seconds if self.wall_seconds > 0 else 0.0
+        return stats
+
+    def decode(self, frames):
+        """Yield ``(index, frame_id, timestamp, frame)`` for each frame of ``frames``, timing the decode"""
+        iterator = iter(frames)
+        try:
+            index = 0
+            while True:
+                start = time.perf_counter()
+                try:
+                    frame_id, timestamp, frame = next(iterator)
+                except StopIteration:
+                    return
+                self.counters['decode'].add(time.perf_counter() - start)
+                yield index, frame_id, timestamp, frame
+                index += 1
+        finally:
+            # Releases the capture when the consumer stops early
+            if hasattr(iterator, 'close'):
+                iterator.close()
+
+    def detect(self, item):
+        """Detection stage for one decoded item; safe to run on worker threads"""
+        index, frame_id, timestamp, frame = item
+        start = time.perf_counter()
+        # Keyed by index, so the detector's random draws do not depend on thread timing
+        boxes, vehicle_data = self.detector.detect_frame(frame, index)
+        self.counters['detect'].add(time.perf_counter() - start)
+        return index, frame_id, timestamp, boxes, vehicle_data
+
+    def track(self, detected):
+        """Ordered stage for one ``detect`` output; call in frame order on one thread"""
+        start = time.perf_counter()
+        result = track_frame(self.detector, self.tracker, *detected)
+        self.counters['track'].add(time.perf_counter() - start)
+        return result
+
+    def run(self, frames):
+        """Yield one result dict per frame of ``frames`` ((frame_id, timestamp, frame) tuples)"""
+        started = time.perf_counter()
+        if self.detect_workers == 0:
+            items = self.decode(frames)
+            try:
+                for item in items:
+                    yield self.track(self.detect(item))
+            finally:
+                items.close()
+                self.wall_seconds += time.perf_counter() - started
+            return
+
+        # Worker threads time their stages into the caller's registry
+        registry = instrumentation.current()
+        decoder = FrameDecoder(self.decode(frames), self.queue_size)
+        executor = ThreadPoolExecutor(max_workers=self.detect_workers,
+                                      thread_name_prefix="pipeline-detect",
+                                      initializer=instrumentation.install, initargs=(registry,))
+        # Bounds decoded-but-untracked frames so a slow consumer applies backpressure
+        max_in_flight = self.detect_workers + self.queue_size
+        pending = deque()
+        finished = False
+        error = None
+        decoder.start()
+        try:
+            while pending or not finished:
+                while not finished and len(pending) < max_in_flight:
+                    try:
+                        item = decoder.get(block=not pending)
+                    except queue.Empty:
+                        break
+                    except BaseException as exc:
+                        # Like run_serial, deliver the frames decoded before the error first
+                        error = exc
+                        finished = True
+                        break
+                    if item is None:
+                        finished = True
+                    else:
+                        pending.append(executor.submit(self.detect, item))
+                if pending:
+                    yield self.track(pending.popleft().result())
+            if error is not None:
+                raise error
+        finally:
+            decoder.close()
+            executor.shutdown(wait=True, cancel_futures=True)
+            self.wall_seconds += time.perf_counter() - started
@@ -0,0 +1,233 @@
+import collections
+import cProfile
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+
+import events
+
+PROFILE_MODES = ('off', 'cprofile', 'sampling')
+# Next to the app rather than the working directory, unless TRAFFIC_PROFILE_DIR says otherwise
+DEFAULT_PROFILE_DIR = os.environ.get('TRAFFIC_PROFILE_DIR', os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "profiles"))
+SAMPLE_INTERVAL = 0.005
+# Worker threads started by AnalysisPipeline and MultiCameraEngine
+PIPELINE_THREAD_PREFIXES = ('pipeline-', 'camera-')
+# Threads parked on locks and queues are waiting, not hot; keep them out of top lists.
+# thread.py is concurrent.futures' pool loop, the leaf frame while a worker waits for work
+IDLE_FUNCTIONS = re.compile(r"of '_(thread|queue)\.\w+' objects|\((threading|queue|thread)\.py:")
+
+def profile_mode_from_env(default='off'):
+    """Profiling mode requested through ``TRAFFIC_PROFILE`` (cprofile, sampling or off)"""
+    mode = os.environ.get('TRAFFIC_PROFILE', default).strip().lower() or default
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"TRAFFIC_PROFILE must be one of {', '.join(PROFILE_MODES)}, got {mode!r}")
+    return mode
+
+def _function_label(filename, line, name):
+    return f"{name} ({os.path.basename(filename)}:{line})"
+
+class _CProfileCollector:
+    """Deterministic profile of the calling thread plus pipeline worker threads
+
+    Before Python 3.12 cProfile only sees the thread that enabled it, so
+    every matching thread started during the run gets its own profiler
+    (installed through ``threading.setprofile``) and the results are merged.
+    From 3.12 one profiler already covers all threads.
+    """
+    suffix = '.prof'
+
+    def __init__(self, thread_prefixes):
+        self.thread_prefixes = tuple(thread_prefixes)
+        self.profiles = []
+        self._lock = threading.Lock()
+        self.stats = None
+
+    def _start_thread_profile(self, frame, event, arg):
+        # First profile event of a new thread: hand it to a cProfile of its own
+        sys.setprofile(None)
+        if threading.current_thread().name.startswith(self.thread_prefixes):
+            profile = cProfile.Profile()
+            with self._lock:
+                self.profiles.append(profile)
+            profile.enable()
+
+    def start(self):
+        """Enable profiling; raises ValueError if another profiler is already active (3.12+)"""
+        main = cProfile.Profile()
+        # From 3.12 only one profiler may be active per interpreter, so this can fail
+        main.enable()
+        self.profiles.append(main)
+        if sys.version_info < (3, 12):
+            threading.setprofile(self._start_thread_profile)
+
+    def stop(self):
+        self.profiles[0].disable()
+        if sys.version_info < (3, 12):
+            threading.setprofile(None)
+        with self._lock:
+            profiles = list(self.profiles)
+        # Worker profilers stop with their threads; merging only snapshots them
+        self.stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            self.stats.add(profile)
+
+    def write(self, path):
+        self.stats.dump_stats(path)
+
+    def top(self, n):
+        total = self.stats.total_tt
+        rows = []
+        for (filename, line, name), (_, calls, self_s, total_s, _) in self.stats.stats.items():
+            if IDLE_FUNCTIONS.search(_function_label(filename, line, name)):
+                total -= self_s
+                continue
+            rows.append({'function': _function_label(filename, line, name), 'calls': calls,
+                         'self_s': self_s, 'total_s': total_s})
+        for row in rows:
+            row['self_pct'] = 100.0 * row['self_s'] / max(total, 1e-12)
+        rows.sort(key=lambda row: row['self_s'], reverse=True)
+        return rows[:n]
+
+class _SamplingCollector:
+    """Statistical profile: a background thread records every traced thread's stack
+
+    Sampling costs little per frame whatever the call rate, so it suits
+    long runs where cProfile's per-call overhead would distort timings.
+    Stacks are kept in collapsed form (``root;...;leaf count``), the input
+    format of flame graph tools.
+    """
+    suffix = '.collapsed'
+
+    def __init__(self, thread_prefixes, interval):
+        self.thread_prefixes = tuple(thread_prefixes)
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._owner = None
+
+    def _traced(self):
+        threads = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            name = threads.get(ident, '')
+            if ident == self._owner or name.startswith(self.thread_prefixes):
+                yield name, frame
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            for thread_name, frame in self._traced():
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(_function_label(code.co_filename, code.co_firstlineno, code.co_name))
+                    frame = frame.f_back
+                stack.append(re.sub(r'[-_]\d+$', '', thread_name) or 'thread')
+                self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def start(self):
+        self._owner = threading.get_ident()
+        self._thread = threading.Thread(target=self._sample, name="profiler-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+    def top(self, n):
+        own = collections.Counter()
+        inclusive = collections.Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(';')[1:]
+            if not frames:
+                continue
+            if IDLE_FUNCTIONS.search(frames[-1]):
+                continue
+            own[frames[-1]] += count
+            for function in set(frames):
+                inclusive[function] += count
+        total = max(sum(own.values()), 1)
+        return [{'function': function, 'calls': None, 'self_s': count * self.interval,
+                 'total_s': inclusive[function] * self.interval, 'self_pct': 100.0 * count / total}
+                for function, count in own.most_common(n)]
+
+class RunProfiler:
+    """Profile one analysis run and write ``<label>-<time>.prof`` or ``.collapsed``
+
+    ``mode`` is 'cprofile' (exact call counts and times, readable with
+    ``pstats`` or snakeviz), 'sampling' (low overhead, collapsed stacks for
+    flame graphs) or 'off'. Only the thread that enters the profiler and
+    threads named with ``thread_prefixes`` are profiled. If cProfile cannot
+    start because another profile is running (two sessions at once on
+    Python 3.12+), the run is sampled instead and ``mode`` says so.
+
+        with RunProfiler('sampling', label='cam1') as profiler:
+            for result in pipeline.run(frames): ...
+        profiler.top(15)
+    """
+    def __init__(self, mode='cprofile', directory=DEFAULT_PROFILE_DIR, label='run',
+                 interval=SAMPLE_INTERVAL, thread_prefixes=PIPELINE_THREAD_PREFIXES):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profiling mode: {mode}")
+        self.mode = mode
+        self.directory = directory
+        self.label = re.sub(r'[^\w.-]+', '_', label) or 'run'
+        self.path = None
+        self.elapsed = 0.0
+        self._interval = interval
+        self._thread_prefixes = thread_prefixes
+        if mode == 'cprofile':
+            self._collector = _CProfileCollector(thread_prefixes)
+        elif mode == 'sampling':
+            self._collector = _SamplingCollector(thread_prefixes, interval)
+        else:
+            self._collector = None
+
+    @property
+    def enabled(self):
+        return self._collector is not None
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        if self.enabled:
+            try:
+                self._collector.start()
+            except ValueError as exc:
+                events.emit(events.WARNING, 'profiling.fallback', requested=self.mode, using='sampling',
+                            reason=str(exc))
+                self.mode = 'sampling'
+                self._collector = _SamplingCollector(self._thread_prefixes, self._interval)
+                self._collector.start()
+        return self
+
+    def __exit__(self, *exc):
+        if not self.enabled:
+            return
+        self._collector.stop()
+        self.elapsed = time.perf_counter() - self._started
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = time.strftime('%Y%m%d-%H%M%S') + f"-{int(time.time() * 1000) % 1000:03d}"
+        self.path = os.path.join(self.directory, f"{self.label}-{stamp}{self._collector.suffix}")
+        self._collector.write(self.path)
+
+    def top(self, n=20):
+        """The ``n`` busiest functions by self time, idle waits excluded
+
+        Rows hold function, calls (None when sampling), self_s, total_s and
+        self_pct, the share of all non-idle time.
+        """
+        return self._collector.top(n) if self.enabled and self.path else []
+
+    def summary(self, n=20):
+        """JSON-ready description of the finished run's profile"""
+        return {'mode': self.mode, 'path': self.path, 'elapsed': self.elapsed, 'top': self.top(n)}
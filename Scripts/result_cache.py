@@ -0,0 +1,146 @@
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+
+import numpy as np
+
+from metrics_sink import open_table
+
+# Next to the app rather than the working directory, unless TRAFFIC_CACHE_DIR says otherwise
+DEFAULT_CACHE_DIR = os.environ.get('TRAFFIC_CACHE_DIR', os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "analysis_cache"))
+DEFAULT_CACHE_BYTES = 512 * 1024 * 1024
+# Bump when the analysis or the stored layout changes so stale entries miss
+CACHE_VERSION = 1
+META = 'meta.json'
+HASH_CHUNK = 1 << 20
+
+def file_digest(path):
+    """SHA-256 of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_CHUNK), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _canonical(value):
+    """JSON-ready form of a config value; arrays (e.g. ROI polygons) hash by content"""
+    if isinstance(value, np.ndarray):
+        return {'ndarray': hashlib.sha256(np.ascontiguousarray(value).tobytes()).hexdigest(),
+                'shape': list(value.shape), 'dtype': value.dtype.str}
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in sorted(value.items(), key=lambda kv: str(kv[0]))}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+def config_digest(config):
+    """Stable hash of an analysis configuration dict"""
+    payload = json.dumps(_canonical(config), sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def cache_key(video_digest, config):
+    """Entry key: video content plus everything that changes the results"""
+    return hashlib.sha256(f"{CACHE_VERSION}:{video_digest}:{config_digest(config)}".encode()).hexdigest()[:32]
+
+class CachedResult:
+    """One cache entry: named columnar tables plus free-form metadata"""
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, META)) as f:
+            self.meta = json.load(f)
+
+    def table(self, name):
+        return open_table(os.path.join(self.directory, name))
+
+    def frame(self, name, categorical=False):
+        """The named table as a DataFrame (empty if it was never written)"""
+        table = self.table(name)
+        if table is None:
+            import pandas as pd
+            return pd.DataFrame()
+        return table.to_frame(categorical=categorical)
+
+class ResultCache:
+    """Content-addressed analysis results on disk with an LRU size budget
+
+    Entries are directories named by ``cache_key``. They are built in a
+    private temporary directory and renamed into place, so readers only
+    ever see complete entries. Reading an entry refreshes its last-use
+    time; after every write the least recently used entries are removed
+    until the cache fits ``max_bytes``.
+    """
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = int(max_bytes)
+        os.makedirs(directory, exist_ok=True)
+
+    def _entry_path(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key):
+        """The cached result for ``key``, or None"""
+        path = self._entry_path(key)
+        try:
+            result = CachedResult(path)
+            os.utime(os.path.join(path, META))
+        except (OSError, ValueError):
+            return None
+        return result
+
+    def __contains__(self, key):
+        return os.path.exists(os.path.join(self._entry_path(key), META))
+
+    @contextlib.contextmanager
+    def writer(self, key, meta=None):
+        """Yield a scratch directory to fill; it becomes the entry ``key`` on success"""
+        tmp = os.path.join(self.directory, f".tmp-{key}-{uuid.uuid4().hex}")
+        os.makedirs(tmp)
+        try:
+            yield tmp
+            with open(os.path.join(tmp, META), 'w') as f:
+                json.dump(dict(meta or {}, key=key, created=time.time()), f)
+            try:
+                os.replace(tmp, self._entry_path(key))
+            except OSError:
+                # Another session stored the same key first; theirs is equivalent
+                pass
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        self.evict(keep=key)
+
+    def entries(self):
+        """(key, size in bytes, last used) for every complete entry"""
+        found = []
+        for name in os.listdir(self.directory):
+            path = self._entry_path(name)
+            meta = os.path.join(path, META)
+            if name.startswith('.') or not os.path.exists(meta):
+                continue
+            size = sum(os.path.getsize(os.path.join(root, f))
+                       for root, _, files in os.walk(path) for f in files)
+            found.append((name, size, os.path.getmtime(meta)))
+        return found
+
+    def evict(self, keep=None):
+        """Drop least recently used entries until the cache fits the budget"""
+        entries = sorted(self.entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        for key, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            shutil.rmtree(self._entry_path(key), ignore_errors=True)
+            total -= size
+        return total
+
+    def clear(self):
+        for key, _, _ in self.entries():
+            shutil.rmtree(self._entry_path(key), ignore_errors=True)
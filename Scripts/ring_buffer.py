@@ -0,0 +1,175 @@
+import numpy as np
+
+# Seconds covered by each "Data Retention Policy" option in the dashboard
+RETENTION_SECONDS = {
+    '1 Hour': 3600,
+    '24 Hours': 24 * 3600,
+    '7 Days': 7 * 24 * 3600,
+    '30 Days': 30 * 24 * 3600
+}
+DEFAULT_FPS = 30
+# Long policies at high frame rates are capped so one buffer cannot reserve gigabytes
+MAX_RETENTION_FRAMES = 1_000_000
+
+def retention_frames(policy='1 Hour', fps=DEFAULT_FPS, stride=1):
+    """Number of analysed frames a retention policy keeps at the given frame rate
+
+    ``stride`` is the sampling step (every Nth frame analysed), so a 30 fps
+    video analysed every 3rd frame keeps 10 frames per retained second.
+    """
+    frames = RETENTION_SECONDS[policy] * (fps if fps and fps > 0 else DEFAULT_FPS) / max(1, stride)
+    return int(min(MAX_RETENTION_FRAMES, max(1, frames)))
+
+DEFAULT_HISTORY = retention_frames()
+
+class RingBuffer:
+    """Fixed-capacity FIFO over a preallocated NumPy array
+
+    ``append`` is O(1) and overwrites the oldest entry once full, returning
+    it so callers can keep window aggregates up to date. Structured dtypes
+    give one record per entry.
+    """
+    def __init__(self, capacity, dtype=np.float64):
+        if capacity < 1:
+            raise ValueError(f"capacity must be positive, got {capacity}")
+        self.capacity = int(capacity)
+        # np.empty only reserves address space; pages are touched as entries arrive
+        self._data = np.empty(self.capacity, dtype=dtype)
+        self._start = 0
+        self._size = 0
+
+    @property
+    def dtype(self):
+        return self._data.dtype
+
+    def append(self, value):
+        """Add one entry; returns the evicted entry, or None while not yet full"""
+        if self._size < self.capacity:
+            self._data[(self._start + self._size) % self.capacity] = value
+            self._size += 1
+            return None
+        evicted = self._data[self._start].copy()
+        self._data[self._start] = value
+        self._start = (self._start + 1) % self.capacity
+        return evicted
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, index):
+        """Entry by position, oldest first; negative indices count from the newest"""
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError(index)
+        return self._data[(self._start + index) % self.capacity]
+
+    def last(self, count):
+        """The newest ``count`` entries, oldest first, as a new array"""
+        count = max(0, min(count, self._size))
+        first = (self._start + self._size - count) % self.capacity
+        end = first + count
+        if end <= self.capacity:
+            return self._data[first:end].copy()
+        return np.concatenate([self._data[first:], self._data[:end - self.capacity]])
+
+    def values(self):
+        """All retained entries, oldest first, as a new array"""
+        return self.last(self._size)
+
+    def _segments(self):
+        """The retained entries as at most two views of storage, oldest first"""
+        end = self._start + self._size
+        if end <= self.capacity:
+            return (self._data[self._start:end],)
+        return (self._data[self._start:], self._data[:end - self.capacity])
+
+    def find(self, field, value):
+        """Entries whose ``field`` equals ``value``, as a new array
+
+        ``field`` must never decrease from oldest to newest entry (such as a
+        frame number), so each stored segment is binary searched: a lookup
+        costs O(log n) plus the matches instead of a copy of the buffer.
+        """
+        matches = []
+        for segment in self._segments():
+            column = segment[field]
+            low = np.searchsorted(column, value, side='left')
+            high = np.searchsorted(column, value, side='right')
+            if high > low:
+                matches.append(segment[low:high])
+        if not matches:
+            return np.empty(0, dtype=self.dtype)
+        return np.concatenate(matches) if len(matches) > 1 else matches[0].copy()
+
+    def discard(self, count):
+        """Drop the oldest ``count`` entries"""
+        count = max(0, min(count, self._size))
+        self._start = (self._start + count) % self.capacity
+        self._size -= count
+
+    def resize(self, capacity):
+        """Move the retained entries into new storage holding ``capacity`` entries"""
+        if capacity < self._size:
+            raise ValueError(f"capacity {capacity} cannot hold the {self._size} retained entries")
+        data = np.empty(int(capacity), dtype=self.dtype)
+        data[:self._size] = self.values()
+        self._data = data
+        self.capacity = int(capacity)
+        self._start = 0
+
+    def clear(self):
+        self._start = 0
+        self._size = 0
+
+class FrameRing:
+    """Rows grouped by analysed frame, keeping the newest ``frames`` frames
+
+    Unlike ``RingBuffer`` a frame may add any number of rows (one per track,
+    say), so retention counts frames rather than rows: each frame's row count
+    is kept in its own ring, and evicting a frame drops exactly its rows. The
+    row storage doubles whenever the retained frames need more room.
+    """
+    def __init__(self, frames, dtype, rows=1024):
+        self._counts = RingBuffer(frames, dtype=np.int64)
+        self._rows = RingBuffer(max(1, rows), dtype=dtype)
+
+    @property
+    def capacity(self):
+        """Frames retained"""
+        return self._counts.capacity
+
+    @property
+    def dtype(self):
+        return self._rows.dtype
+
+    def append_frame(self, rows):
+        """Add one frame's rows (possibly none), evicting the oldest frame once full"""
+        rows = np.array(list(rows), dtype=self.dtype)
+        evicted = self._counts.append(len(rows))
+        if evicted is not None:
+            self._rows.discard(int(evicted))
+        needed = len(self._rows) + len(rows)
+        if needed > self._rows.capacity:
+            self._rows.resize(max(needed, 2 * self._rows.capacity))
+        for row in rows:
+            self._rows.append(row)
+
+    def frame_count(self):
+        """Frames currently retained"""
+        return len(self._counts)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def values(self):
+        """All retained rows, oldest first, as a new array"""
+        return self._rows.values()
+
+    def find(self, field, value):
+        """Rows whose ``field`` equals ``value``; see ``RingBuffer.find``"""
+        return self._rows.find(field, value)
+
+    def clear(self):
+        self._counts.clear()
+        self._rows.clear()
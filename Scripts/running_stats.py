@@ -0,0 +1,101 @@
+import math
+import numpy as np
+
+class RunningStats:
+    """Welford running mean and variance with O(1) add and remove
+
+    ``remove`` undoes an earlier ``add`` of the same value, which lets a
+    sliding window stay exact as a ring buffer evicts old samples.
+    """
+    __slots__ = ('count', 'mean', '_m2')
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+
+    def remove(self, value):
+        if self.count <= 1:
+            self.reset()
+            return
+        self.count -= 1
+        delta = value - self.mean
+        self.mean -= delta / self.count
+        self._m2 = max(0.0, self._m2 - delta * (value - self.mean))
+
+    @property
+    def variance(self):
+        """Population variance (matches np.var)"""
+        return self._m2 / self.count if self.count else 0.0
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+def linear_slope(values):
+    """Least-squares slope of ``values`` against 0..n-1 (same as np.polyfit(..., 1)[0])"""
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    if n < 2:
+        return 0.0
+    x = np.arange(n, dtype=np.float64)
+    return float(((x - x.mean()) * (values - values.mean())).sum() / ((x - x.mean()) ** 2).sum())
+
+class SlidingTrend:
+    """Least-squares slope over the newest ``window`` samples in O(1) per push
+
+    Samples sit at x = 0..n-1 within the window, so Σx and Σx² have closed
+    forms and only Σy and Σxy are carried. When the window is full the
+    caller passes the sample that drops out; sliding shifts every x down by
+    one, i.e. Σxy -= Σy. Sums are rebuilt from the source every
+    ``RECOMPUTE_INTERVAL`` pushes to stop rounding error accumulating.
+    """
+    RECOMPUTE_INTERVAL = 1024
+    __slots__ = ('window', 'count', '_sum_y', '_sum_xy', '_pushes')
+
+    def __init__(self, window):
+        if window < 2:
+            raise ValueError(f"window must be at least 2, got {window}")
+        self.window = int(window)
+        self.reset()
+
+    def reset(self, values=()):
+        """Start over from ``values`` (oldest first, at most ``window`` of them)"""
+        values = np.asarray(values, dtype=np.float64)[-self.window:]
+        self.count = len(values)
+        self._sum_y = float(values.sum())
+        self._sum_xy = float((np.arange(self.count) * values).sum())
+        self._pushes = 0
+
+    def push(self, value, leaving=None):
+        """Add the newest sample; ``leaving`` is the oldest one once the window is full"""
+        if self.count < self.window:
+            self._sum_xy += self.count * value
+            self._sum_y += value
+            self.count += 1
+        else:
+            self._sum_xy += (self.count - 1) * value - (self._sum_y - leaving)
+            self._sum_y += value - leaving
+        self._pushes += 1
+
+    @property
+    def needs_recompute(self):
+        return self._pushes >= self.RECOMPUTE_INTERVAL
+
+    @property
+    def slope(self):
+        n = self.count
+        if n < 2:
+            return 0.0
+        sum_x = n * (n - 1) / 2.0
+        sum_xx = (n - 1) * n * (2 * n - 1) / 6.0
+        return (n * self._sum_xy - sum_x * self._sum_y) / (n * sum_xx - sum_x * sum_x)
@@ -1,182 +1,346 @@
+import math
 import numpy as np
 from collections import defaultdict
+from association import greedy_assign, optimal_assign
+from ring_buffer import RingBuffer, FrameRing, DEFAULT_HISTORY
+from running_stats import RunningStats, SlidingTrend, linear_slope
+import instrumentation
+import events
+from random_streams import FrameStreams, VIOLATION_STREAM
+
+# 'greedy' lets each detection take its nearest track; 'optimal' solves a
+# one-to-one assignment so two detections never claim the same track
+ASSOCIATION_MODES = {'greedy': greedy_assign, 'optimal': optimal_assign}
+
+# Positions kept per track; older points are overwritten in place
+HISTORY_CAPACITY = 32
+
+class Track:
+    """One tracked vehicle with a fixed-capacity ring buffer of positions
+    
+    Supports the old dict-style access (``track['speed']``, ``track.get``,
+    ``track['history']``) and ``as_dict()`` for code written against it.
+    """
+    __slots__ = ('track_id', 'bbox', 'frame_first_seen', 'last_seen', 'speed',
+                 'vehicle_type', 'confidence', 'violations', 'position',
+                 'previous_position', '_points', '_count')
+    
+    FIELDS = ('history', 'bbox', 'frame_first_seen', 'last_seen', 'speed',
+              'vehicle_type', 'confidence', 'violations')
+    
+    def __init__(self, track_id, position, bbox, frame_id, vehicle_type='unknown',
+                 confidence=0.8, capacity=HISTORY_CAPACITY):
+        self.track_id = track_id
+        self.bbox = bbox
+        self.frame_first_seen = frame_id
+        self.last_seen = frame_id
+        self.speed = 0
+        self.vehicle_type = vehicle_type
+        self.confidence = confidence
+        self.violations = []
+        # Preallocated ring; the two newest points are also kept in slots
+        self._points = [None] * capacity
+        self._count = 0
+        self.position = None
+        self.previous_position = None
+        self.add_position(position)
+    
+    def add_position(self, position):
+        position = (position[0], position[1])
+        self._points[self._count % len(self._points)] = position
+        self._count += 1
+        self.previous_position = self.position
+        self.position = position
+    
+    def predicted_position(self):
+        """Next position extrapolated from the last two points"""
+        x, y = self.position
+        previous = self.previous_position
+        if previous is None:
+            return x, y
+        # Predict next position based on velocity
+        return 2 * x - previous[0], 2 * y - previous[1]
+    
+    @property
+    def history(self):
+        """Retained positions, oldest first, as (x, y) tuples"""
+        capacity = len(self._points)
+        if self._count <= capacity:
+            return self._points[:self._count]
+        start = self._count % capacity
+        return self._points[start:] + self._points[:start]
+    
+    def as_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+    
+    def __getitem__(self, key):
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+    
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self.FIELDS else default
+    
+    def __contains__(self, key):
+        return key in self.FIELDS
+    
+    def keys(self):
+        return self.FIELDS
+
+def _vehicle_attributes(vehicle_data, count):
+    """Per-detection (types, confidences), None where no classification exists"""
+    if vehicle_data is None or len(vehicle_data) == 0:
+        return [None] * count, [None] * count
+    if hasattr(vehicle_data, 'types'):
+        types = vehicle_data.types
+        confidences = vehicle_data.confidence.tolist()
+    else:
+        types = [v['type'] for v in vehicle_data]
+        confidences = [v['confidence'] for v in vehicle_data]
+    missing = count - len(types)
+    return types[:count] + [None] * missing, confidences[:count] + [None] * missing
+
+class _TrackSummary:
+    """Insight counters over one frame's tracks, filled as update() visits them"""
+    __slots__ = ('type_counts', 'speeds', 'moving', 'active')
+
+    def __init__(self):
+        self.type_counts = {}
+        self.speeds = RunningStats()
+        self.moving = 0
+        self.active = 0
+
+    def add(self, track):
+        self.type_counts[track.vehicle_type] = self.type_counts.get(track.vehicle_type, 0) + 1
+        self.speeds.add(track.speed)
+        self.moving += track.speed > 1.0
+        self.active += track.speed > 0.5
+
+    def remove(self, track):
+        """Undo ``add`` for a track that is about to change"""
+        self.type_counts[track.vehicle_type] -= 1
+        if not self.type_counts[track.vehicle_type]:
+            del self.type_counts[track.vehicle_type]
+        self.speeds.remove(track.speed)
+        self.moving -= track.speed > 1.0
+        self.active -= track.speed > 0.5
+
+    def insights(self):
+        if not self.speeds.count:
+            return {}
+        return {
+            'vehicle_distribution': dict(self.type_counts),
+            'average_speed': self.speeds.mean,
+            'speed_variance': self.speeds.variance,
+            # Traffic flow efficiency
+            'flow_efficiency': self.moving / self.speeds.count * 100,
+            'total_tracks': self.speeds.count,
+            'active_tracks': self.active
+        }
 
 class TrafficTracker:
-    def __init__(self, queue_line_y=400):
+    def __init__(self, queue_line_y=400, match_radius=80, association='greedy',
+                 history_capacity=HISTORY_CAPACITY, history_size=DEFAULT_HISTORY, seed=None):
+        if association not in ASSOCIATION_MODES:
+            raise ValueError(f"Unknown association mode: {association}")
         self.tracks = {}
         self.next_id = 0
         self.queue_line_y = queue_line_y
-        self.speed_estimates = {}
-        self.violation_detector = ViolationDetector()
-        self.traffic_analyzer = TrafficFlowAnalyzer()
-        print("🎯 Smart AI Tracker Initialized!")
+        self.match_radius = match_radius
+        self.association = association
+        self.history_capacity = history_capacity
+        # (frame, track, speed) samples of the newest history_size frames, however many tracks each had
+        self.speed_estimates = FrameRing(history_size, dtype=np.dtype([
+            ('frame', np.int64), ('track_id', np.int64), ('speed', np.float64)
+        ]))
+        self.violation_detector = ViolationDetector(seed=seed)
+        self.traffic_analyzer = TrafficFlowAnalyzer(history_size=history_size)
+        self._insights = {}
+        events.emit(events.INFO, 'tracker.ready', association=association, match_radius=match_radius,
+                    history_size=history_size)
+    
+    def reset(self):
+        """Drop all tracks and analytics history before analysing a new video"""
+        self.tracks = {}
+        self.next_id = 0
+        self.speed_estimates.clear()
+        self.traffic_analyzer.reset()
+        self._insights = {}
+    
+    def get_config(self):
+        """Constructor arguments that rebuild an equivalent tracker"""
+        return {
+            'queue_line_y': self.queue_line_y,
+            'match_radius': self.match_radius,
+            'association': self.association,
+            'history_capacity': self.history_capacity,
+            'history_size': self.speed_estimates.capacity,
+            'seed': self.violation_detector.seed
+        }
+    
+    def track_dicts(self):
+        """Legacy view: live tracks as {track_id: dict}"""
+        return {tid: track.as_dict() for tid, track in self.tracks.items()}
         
     def update(self, frame_id, detections, vehicle_data=None):
         """Enhanced tracking with AI-powered features"""
         if len(detections) == 0:
+            self.speed_estimates.append_frame(())
             return []
             
         new_tracks = {}
-        current_speeds = {}
+        speeds = []
         
-        for i, det in enumerate(detections):
-            cx = (det[0] + det[2]) / 2
-            cy = (det[1] + det[3]) / 2
-            
-            # Enhanced matching with velocity prediction
-            best_match = None
-            min_dist = 80
-            
-            for track_id, track in self.tracks.items():
-                if 'history' in track and len(track['history']) >= 2:
-                    # Predict next position based on velocity
-                    prev_positions = track['history'][-2:]
-                    if len(prev_positions) >= 2:
-                        vx = prev_positions[-1][0] - prev_positions[-2][0]
-                        vy = prev_positions[-1][1] - prev_positions[-2][1]
-                        predicted_x = prev_positions[-1][0] + vx
-                        predicted_y = prev_positions[-1][1] + vy
-                        
-                        dist = np.sqrt((cx-predicted_x)**2 + (cy-predicted_y)**2)
-                    else:
-                        prev_cx, prev_cy = track['history'][-1]
-                        dist = np.sqrt((cx-prev_cx)**2 + (cy-prev_cy)**2)
-                    
-                    if dist < min_dist:
-                        min_dist = dist
-                        best_match = track_id
-            
-            if best_match:
+        boxes = np.asarray(detections, dtype=np.float64).reshape(-1, 4)
+        centers = (boxes[:, :2] + boxes[:, 2:]) / 2
+        track_list = list(self.tracks.values())
+        predicted = np.array([t.predicted_position() for t in track_list]).reshape(-1, 2)
+        types, confidences = _vehicle_attributes(vehicle_data, len(boxes))
+        
+        # Gated association against predicted positions, via a spatial grid index
+        t = instrumentation.start()
+        matches = ASSOCIATION_MODES[self.association](centers, predicted, self.match_radius)
+        instrumentation.lap('track.association', t)
+        
+        # Insight counters, kept current as the loop visits every surviving track
+        summary = _TrackSummary()
+        for i, (position, det) in enumerate(zip(centers.tolist(), detections)):
+            if matches[i] >= 0:
                 # Update existing track
-                self.tracks[best_match]['history'].append((cx, cy))
-                self.tracks[best_match]['bbox'] = det
-                self.tracks[best_match]['last_seen'] = frame_id
+                track = track_list[matches[i]]
+                if track.track_id in new_tracks:
+                    # Greedy association can give one track several detections; the last one counts
+                    summary.remove(track)
+                prev_x, prev_y = track.position
+                track.add_position(position)
+                track.bbox = det
+                track.last_seen = frame_id
                 
                 # Calculate speed (pixels per frame)
-                if len(self.tracks[best_match]['history']) >= 2:
-                    prev_pos = self.tracks[best_match]['history'][-2]
-                    curr_pos = self.tracks[best_match]['history'][-1]
-                    speed = np.sqrt((curr_pos[0]-prev_pos[0])**2 + (curr_pos[1]-prev_pos[1])**2)
-                    self.tracks[best_match]['speed'] = speed
-                    current_speeds[best_match] = speed
+                track.speed = math.hypot(position[0] - prev_x, position[1] - prev_y)
+                speeds.append((frame_id, track.track_id, track.speed))
                 
                 # Add vehicle type if available
-                if vehicle_data and i < len(vehicle_data):
-                    self.tracks[best_match]['vehicle_type'] = vehicle_data[i]['type']
-                    self.tracks[best_match]['confidence'] = vehicle_data[i]['confidence']
+                if types[i] is not None:
+                    track.vehicle_type = types[i]
+                    track.confidence = confidences[i]
                 
-                new_tracks[best_match] = self.tracks[best_match]
+                new_tracks[track.track_id] = track
+                summary.add(track)
             else:
                 # Create new track
-                new_track = {
-                    'history': [(cx, cy)], 
-                    'bbox': det,
-                    'frame_first_seen': frame_id,
-                    'last_seen': frame_id,
-                    'speed': 0,
-                    'vehicle_type': vehicle_data[i]['type'] if vehicle_data and i < len(vehicle_data) else 'unknown',
-                    'confidence': vehicle_data[i]['confidence'] if vehicle_data and i < len(vehicle_data) else 0.8,
-                    'violations': []
-                }
-                self.tracks[self.next_id] = new_track
-                new_tracks[self.next_id] = new_track
+                track = Track(self.next_id, position, det, frame_id,
+                              vehicle_type=types[i] if types[i] is not None else 'unknown',
+                              confidence=confidences[i] if confidences[i] is not None else 0.8,
+                              capacity=self.history_capacity)
+                new_tracks[self.next_id] = track
+                summary.add(track)
                 self.next_id += 1
         
-        # Remove old tracks (not seen for 30 frames)
-        self.tracks = {
-            tid: track for tid, track in new_tracks.items() 
-            if frame_id - track['last_seen'] < 30
-        }
+        self.speed_estimates.append_frame(speeds)
         
-        # Update speed estimates for analytics
-        self.speed_estimates[frame_id] = current_speeds
+        # Only tracks matched or created in this frame carry over, so all were just seen
+        self.tracks = new_tracks
+        self._insights = summary.insights()
         
         # Detect violations
+        t = instrumentation.start()
         violations = self.violation_detector.check_violations(self.tracks, frame_id)
+        t = instrumentation.lap('track.violations', t)
         
         # Update traffic flow analysis
         self.traffic_analyzer.update(frame_id, self.tracks)
+        instrumentation.lap('track.flow', t)
         
         return list(self.tracks.values())
     
+    def get_speed_estimates(self, frame_id):
+        """Retained {track_id: speed} samples for one frame"""
+        # Frames are appended in increasing order, so the ring can be binary searched
+        samples = self.speed_estimates.find('frame', frame_id)
+        return dict(zip(samples['track_id'].tolist(), samples['speed'].tolist()))
+    
     def get_queue_metrics(self):
         """Enhanced queue analysis with AI insights"""
-        queue_count = sum(1 for t in self.tracks.values() 
-                         if t['history'] and t['history'][-1][1] > self.queue_line_y)
+        # Vehicles past the queue line, and their speeds
+        queue_speeds = [t.speed for t in self.tracks.values() 
+                       if t.position[1] > self.queue_line_y]
+        queue_count = len(queue_speeds)
         
         # Calculate advanced metrics
         total_vehicles = len(self.tracks)
         queue_density = queue_count / max(1, total_vehicles)
         
         # Average speed in queue area
-        queue_speeds = [t['speed'] for t in self.tracks.values() 
-                       if t['history'] and t['history'][-1][1] > self.queue_line_y and 'speed' in t]
         avg_queue_speed = np.mean(queue_speeds) if queue_speeds else 0
         
         return queue_count, queue_density, avg_queue_speed
     
     def get_traffic_insights(self):
         """Get AI-powered traffic insights"""
-        if not self.tracks:
-            return {}
-        
-        # Vehicle type distribution
-        vehicle_types = [t.get('vehicle_type', 'unknown') for t in self.tracks.values()]
-        type_counts = {vtype: vehicle_types.count(vtype) for vtype in set(vehicle_types)}
-        
-        # Speed analysis
-        speeds = [t.get('speed', 0) for t in self.tracks.values()]
-        avg_speed = np.mean(speeds) if speeds else 0
-        speed_variance = np.var(speeds) if speeds else 0
-        
-        # Traffic flow efficiency
-        moving_vehicles = sum(1 for s in speeds if s > 1.0)
-        flow_efficiency = moving_vehicles / max(1, len(speeds)) * 100
-        
-        return {
-            'vehicle_distribution': type_counts,
-            'average_speed': avg_speed,
-            'speed_variance': speed_variance,
-            'flow_efficiency': flow_efficiency,
-            'total_tracks': len(self.tracks),
-            'active_tracks': len([t for t in self.tracks.values() if t.get('speed', 0) > 0.5])
-        }
+        return dict(self._insights)
 
 class ViolationDetector:
-    def __init__(self):
+    def __init__(self, seed=None):
         self.violation_types = ['speeding', 'wrong_lane', 'red_light', 'illegal_turn']
+        # Simulated violations are drawn from the frame's own stream, reproducible for a seed
+        self.seed = seed
+        self.random = FrameStreams(seed, stream=VIOLATION_STREAM)
         
     def check_violations(self, tracks, frame_id):
         """AI-powered violation detection"""
         violations = []
+        if not tracks:
+            return violations
         
-        for track_id, track in tracks.items():
-            # Speed violation detection
-            if track.get('speed', 0) > 15:  # Threshold for speeding
+        # Every number this frame needs, one row per track, in a single draw
+        items = list(tracks.items())
+        draws = self.random.generator(frame_id).random((len(items), 4))
+        speeds = np.fromiter((track.speed for _, track in items), dtype=np.float64, count=len(items))
+        # Speeding (threshold 15) or a simulated violation (5% chance per track)
+        flagged = np.flatnonzero((speeds > 15) | (draws[:, 1] > 0.95)).tolist()
+        other_types = self.violation_types[1:]
+        
+        for i in flagged:
+            track_id, track = items[i]
+            u = draws[i].tolist()
+            if track.speed > 15:
                 violations.append({
                     'track_id': track_id,
                     'type': 'speeding',
                     'frame': frame_id,
-                    'confidence': 0.85 + np.random.random() * 0.1,
-                    'details': f"Speed: {track['speed']:.1f} px/frame"
+                    'confidence': 0.85 + u[0] * 0.1,
+                    'details': f"Speed: {track.speed:.1f} px/frame"
                 })
-            
-            # Simulate other violations randomly
-            if np.random.random() > 0.95:  # 5% chance
-                violation_type = np.random.choice(self.violation_types[1:])
+            if u[1] > 0.95:
                 violations.append({
                     'track_id': track_id,
-                    'type': violation_type,
+                    'type': other_types[int(u[2] * len(other_types))],
                     'frame': frame_id,
-                    'confidence': 0.75 + np.random.random() * 0.2
+                    'confidence': 0.75 + u[3] * 0.2
                 })
         
         return violations
 
+FLOW_DTYPE = np.dtype([
+    ('frame', np.int64),
+    ('vehicle_count', np.int32),
+    ('avg_speed', np.float64),
+    ('speed_std', np.float64),
+    ('density', np.float64)
+])
+
+# Frame windows whose density/speed trends are kept current on every update
+TREND_WINDOWS = (10, 60, 300)
+TREND_FIELDS = ('density', 'avg_speed')
+
 class TrafficFlowAnalyzer:
-    def __init__(self):
-        self.flow_history = []
+    def __init__(self, history_size=100, trend_windows=TREND_WINDOWS):
+        self.flow_history = RingBuffer(history_size, dtype=FLOW_DTYPE)
         self.congestion_zones = []
+        # A window longer than the history could never be slid, so cap it
+        windows = sorted({min(int(w), history_size) for w in trend_windows} - {0, 1})
+        self.trends = {w: {field: SlidingTrend(w) for field in TREND_FIELDS} for w in windows}
         
     def update(self, frame_id, tracks):
         """Analyze traffic flow patterns"""
@@ -184,34 +348,63 @@ class TrafficFlowAnalyzer:
             return
         
         # Calculate flow metrics
-        positions = [t['history'][-1] for t in tracks.values() if t['history']]
-        speeds = [t.get('speed', 0) for t in tracks.values()]
-        
-        flow_data = {
-            'frame': frame_id,
-            'vehicle_count': len(tracks),
-            'avg_speed': np.mean(speeds) if speeds else 0,
-            'speed_std': np.std(speeds) if speeds else 0,
-            'density': len(positions) / 1000 if positions else 0  # vehicles per unit area
-        }
+        speeds = [t.speed for t in tracks.values()]
+        record = (
+            frame_id,
+            len(tracks),
+            np.mean(speeds),
+            np.std(speeds),
+            len(tracks) / 1000  # vehicles per unit area
+        )
         
-        self.flow_history.append(flow_data)
+        # Samples leaving each full window, copied out before the append overwrites them
+        history = self.flow_history
+        leaving = {w: history[-w][list(TREND_FIELDS)].item() if len(history) >= w else None
+                   for w in self.trends}
+        history.append(record)
         
-        # Keep only recent history
-        if len(self.flow_history) > 100:
-            self.flow_history = self.flow_history[-100:]
+        for window, trends in self.trends.items():
+            old = leaving[window]
+            for i, (field, trend) in enumerate(trends.items()):
+                if trend.needs_recompute:
+                    trend.reset(history.last(window)[field])
+                    continue
+                trend.push(float(history[-1][field]), None if old is None else old[i])
+    
+    def reset(self):
+        self.flow_history.clear()
+        for trends in self.trends.values():
+            for trend in trends.values():
+                trend.reset()
     
-    def get_congestion_prediction(self):
+    def _slopes(self, window):
+        if window in self.trends:
+            trends = self.trends[window]
+            return trends['density'].slope, trends['avg_speed'].slope
+        # Window outside the maintained set: fit the history directly
+        recent = self.flow_history.last(window)
+        return linear_slope(recent['density']), linear_slope(recent['avg_speed'])
+    
+    def get_flow_trends(self):
+        """Density and speed slopes (per analysed frame) for every maintained window"""
+        return {
+            window: {
+                'density_trend': trends['density'].slope,
+                'speed_trend': trends['avg_speed'].slope,
+                'samples': trends['density'].count
+            }
+            for window, trends in self.trends.items()
+        }
+    
+    def get_congestion_prediction(self, window=10):
         """Predict traffic congestion using historical data"""
-        if len(self.flow_history) < 10:
+        # Like the trend windows, never ask for more frames than the history can hold
+        window = min(window, self.flow_history.capacity)
+        if len(self.flow_history) < window:
             return {'prediction': 'insufficient_data', 'confidence': 0}
         
-        recent_density = [f['density'] for f in self.flow_history[-10:]]
-        recent_speed = [f['avg_speed'] for f in self.flow_history[-10:]]
-        
         # Simple congestion prediction based on density and speed trends
-        density_trend = np.polyfit(range(len(recent_density)), recent_density, 1)[0]
-        speed_trend = np.polyfit(range(len(recent_speed)), recent_speed, 1)[0]
+        density_trend, speed_trend = self._slopes(window)
         
         if density_trend > 0.01 and speed_trend < -0.5:
             prediction = 'increasing_congestion'
@@ -1,5 +1,5 @@
 import streamlit as st
-import cv2
+import importlib
 import numpy as np
 import pandas as pd
 import os
@@ -7,40 +7,55 @@ import time
 from datetime import datetime, timedelta
 import json
 import base64
+import shutil
 
-# Try to import custom modules with error handling
-try:
-    from video_processor import extract_frames
-except ImportError:
-    st.error("video_processor module not found")
-    def extract_frames(video_path):
-        return []
+from ring_buffer import retention_frames, DEFAULT_HISTORY
+from tracker import TrafficTracker
+from pipeline import AnalysisPipeline, frame_metrics
+from metrics_sink import (ColumnarSink, METRICS_SCHEMA, VIOLATIONS_SCHEMA, SIGNALS_SCHEMA,
+                          DETECTIONS_SCHEMA, TRACKS_SCHEMA)
+from result_cache import ResultCache, cache_key
+from uploads import UploadStore
+import instrumentation
+from profiling import RunProfiler, PROFILE_MODES, profile_mode_from_env
 
-try:
-    from detector import VehicleDetector
-except ImportError:
-    st.error("detector module not found")
-    class VehicleDetector:
-        def detect(self, frame):
-            return []
+def detection_columns(frame_id, boxes, vehicle_data):
+    """One frame's detections as sink columns"""
+    boxes = np.asarray(boxes, dtype=np.int32).reshape(-1, 4)
+    return {'frame': np.full(len(boxes), frame_id, dtype=np.int32),
+            'x1': boxes[:, 0], 'y1': boxes[:, 1], 'x2': boxes[:, 2], 'y2': boxes[:, 3],
+            'vehicle_type': [v['type'] for v in vehicle_data],
+            'confidence': [v['confidence'] for v in vehicle_data]}
 
-try:
-    from tracker import TrafficTracker
-except ImportError:
-    st.error("tracker module not found")
-    class TrafficTracker:
-        def update(self, frame_id, boxes, vehicle_data=None):
-            return []
-        def get_queue_metrics(self):
-            return 0, 0, 0
+def track_columns(frame_id, tracks):
+    """One frame's live tracks as sink columns"""
+    boxes = np.array([t.bbox for t in tracks], dtype=np.int32).reshape(-1, 4)
+    return {'frame': np.full(len(tracks), frame_id, dtype=np.int32),
+            'track_id': [t.track_id for t in tracks],
+            'x1': boxes[:, 0], 'y1': boxes[:, 1], 'x2': boxes[:, 2], 'y2': boxes[:, 3],
+            'speed': [t.speed for t in tracks], 'vehicle_type': [t.vehicle_type for t in tracks]}
 
-# Page config for professional theme
-st.set_page_config(
-    page_title="Traffic Management System",
-    page_icon="🚦",
-    layout="wide",
-    initial_sidebar_state="expanded"
-)
+@st.cache_resource(show_spinner=False)
+def analysis_cache():
+    """Analysed uploads, keyed by video content and analysis settings; created on first upload"""
+    return ResultCache()
+
+# OpenCV-backed modules load on first use, so pages that never analyse video skip cv2
+def iter_frames(video_path, skip_frames=3, max_frames=None):
+    video_processor = importlib.import_module("video_processor")
+    return video_processor.iter_frames(video_path, skip_frames=skip_frames, max_frames=max_frames)
+
+def sampled_frame_count(video_path, skip_frames=3, max_frames=None):
+    video_processor = importlib.import_module("video_processor")
+    return video_processor.sampled_frame_count(video_path, skip_frames=skip_frames, max_frames=max_frames)
+
+def probe_video(video_path):
+    return importlib.import_module("video_processor").probe_video(video_path)
+
+def create_detector(roi=None, scale=1.0, backend='threshold', history_size=DEFAULT_HISTORY, seed=None):
+    detector = importlib.import_module("detector")
+    return detector.VehicleDetector(roi=roi, scale=scale, backend=backend, history_size=history_size,
+                                    seed=seed)
 
 # Dark theme colors (permanent)
 bg_primary = "#0f172a"
@@ -59,7 +74,7 @@ accent_primary = "#667eea"
 accent_secondary = "#764ba2"
 
 # Custom CSS with permanent dark theme
-st.markdown(f"""
+THEME_CSS = f"""
 <style>
     @import url('https://fonts.googleapis.com/css2?family=Inter:wght@400;500;600;700;800;900&display=swap');
     
@@ -690,83 +705,177 @@ st.markdown(f"""
         background: linear-gradient(135deg, #5a67d8, #6b46c1);
     }}
 </style>
-""", unsafe_allow_html=True)
+"""
 
-# Main header with classic enterprise styling
-st.markdown('<div class="main-header"><h1>Traffic Management System</h1><p>Enterprise-Grade Traffic Monitoring & Control Platform</p></div>', unsafe_allow_html=True)
+# Background subtraction keeps a model of the empty road across frames
+DETECTION_BACKENDS_BY_MODE = {"Background Subtraction (MOG2)": "mog2", "Background Subtraction (KNN)": "knn"}
+# Detection runs on a downscaled copy of each frame in the faster modes
+DETECTION_SCALES = {"Real-time": 1.0, "High Accuracy": 1.0, "Balanced Performance": 0.75, "Fast Processing": 0.5}
 
-# System Status Dashboard with enhanced styling
-st.markdown("## System Status Overview")
-col1, col2, col3, col4, col5 = st.columns(5)
-with col1:
-    st.markdown('<div class="system-card"><h4>AI Processing Engine</h4><h2>ONLINE</h2><small>Detection accuracy: 94.7%</small></div>', unsafe_allow_html=True)
-with col2:
-    st.markdown('<div class="system-card"><h4>Traffic Control System</h4><h2>ACTIVE</h2><small>Adaptive signal timing enabled</small></div>', unsafe_allow_html=True)
-with col3:
-    st.markdown('<div class="system-card"><h4>Data Processing Unit</h4><h2>RUNNING</h2><small>Real-time analysis active</small></div>', unsafe_allow_html=True)
-with col4:
-    st.markdown('<div class="system-card"><h4>Security Module</h4><h2>SECURED</h2><small>All systems protected</small></div>', unsafe_allow_html=True)
-with col5:
-    st.markdown('<div class="system-card"><h4>Network Infrastructure</h4><h2>CONNECTED</h2><small>99.9% uptime maintained</small></div>', unsafe_allow_html=True)
+# Sidebar choices for the opt-in profiler around each upload analysis
+PROFILE_LABELS = {"Off": 'off', "cProfile (exact)": 'cprofile', "Sampling (low overhead)": 'sampling'}
+PROFILE_TOP_N = 25
+# Seed for simulated classifications, violations and signal states: same video and settings, same results
+ANALYSIS_SEED = 0
+SIGNAL_STATES = ['GREEN', 'YELLOW', 'RED']
+# Upper bounds of GREEN and YELLOW for one uniform draw (60% / 10% / 30%)
+SIGNAL_THRESHOLDS = [0.6, 0.7]
 
-# Sidebar for system controls with enhanced professional styling
-st.sidebar.markdown("## System Control Panel")
-st.sidebar.markdown('<div class="status-card status-online">● All Systems Operational</div>', unsafe_allow_html=True)
-
-# System Configuration
-st.sidebar.markdown("### Processing Configuration")
-ai_mode = st.sidebar.selectbox("Detection Mode", 
-    ["Standard Detection", "Enhanced Analysis", "Real-time Processing", "Batch Analysis", "Custom Configuration"])
+# Helper functions
+def roi_polygon(x, y, width, height):
+    """Detector ROI covering the ``width`` x ``height`` rectangle at (x, y), in frame pixels"""
+    x1, y1 = x + width - 1, y + height - 1
+    return (((x, y), (x1, y), (x1, y1), (x, y1)),)
 
-st.sidebar.markdown("### Traffic Management Controls")
-traffic_light_control = st.sidebar.checkbox("Adaptive Signal Control", value=True)
-violation_detection = st.sidebar.checkbox("Violation Detection System", value=True)
-congestion_prediction = st.sidebar.checkbox("Congestion Analysis Engine", value=True)
-emergency_response = st.sidebar.checkbox("Emergency Response Protocol", value=True)
+def history_size_for(video_path, retention='1 Hour', skip_frames=3):
+    """Analysed frames kept in detector/tracker histories under the retention policy"""
+    fps = probe_video(video_path)['fps']
+    return retention_frames(retention, fps, skip_frames)
 
-st.sidebar.markdown("### System Integration")
-iot_sensors = st.sidebar.checkbox("IoT Sensor Network", value=True)
-weather_integration = st.sidebar.checkbox("Weather Data Integration", value=True)
-social_media_monitoring = st.sidebar.checkbox("Social Media Monitoring", value=False)
+def session_upload(uploaded_file):
+    """This session's copy of the upload on disk, streamed and hashed once per uploaded file"""
+    store = st.session_state.get('upload_store')
+    if store is None:
+        # Per-session directory so concurrent users never overwrite each other's video
+        store = st.session_state['upload_store'] = UploadStore()
+    return store.put(uploaded_file)
 
-st.sidebar.markdown("### Advanced Settings")
-ai_sensitivity = st.sidebar.slider("Detection Sensitivity Level", 0.5, 1.0, 0.85, 0.05)
-processing_speed = st.sidebar.selectbox("Processing Mode", ["Real-time", "High Accuracy", "Balanced Performance", "Fast Processing"])
-data_retention = st.sidebar.selectbox("Data Retention Policy", ["1 Hour", "24 Hours", "7 Days", "30 Days"])
+def analysis_engine(roi, scale, backend, association, history_size):
+    """Detector/tracker pair kept in session state, rebuilt only when detection settings change"""
+    settings = (roi, scale, backend, association, history_size)
+    engine = st.session_state.get('analysis_engine')
+    if engine is None or engine['settings'] != settings:
+        engine = {
+            'settings': settings,
+            'detector': create_detector(roi=roi, scale=scale, backend=backend,
+                                        history_size=history_size, seed=ANALYSIS_SEED),
+            'tracker': TrafficTracker(association=association, history_size=history_size,
+                                      seed=ANALYSIS_SEED)
+        }
+        st.session_state['analysis_engine'] = engine
+    else:
+        # Same settings: keep the objects (and any worker pool) but start from a clean state
+        engine['detector'].reset()
+        engine['tracker'].reset()
+    return engine['detector'], engine['tracker']
 
-# System metrics with enhanced styling
-st.sidebar.markdown("### Performance Metrics")
-st.sidebar.metric("CPU Utilization", "23%", delta="-5%")
-st.sidebar.metric("Memory Usage", "67%", delta="+12%")
-st.sidebar.metric("Network Status", "98.7%", delta="+0.3%")
-st.sidebar.metric("Processing Rate", "1.2K fps", delta="+200 fps")
+@st.cache_data(show_spinner=False, max_entries=8)
+def quick_analysis(video_path, modified, roi, scale, backend, association, retention, max_frames=20):
+    """Per-frame vehicle and queue counts for the first frames of a video"""
+    history_size = history_size_for(video_path, retention)
+    detector = create_detector(roi=roi, scale=scale, backend=backend, history_size=history_size,
+                               seed=ANALYSIS_SEED)
+    tracker = TrafficTracker(association=association, history_size=history_size, seed=ANALYSIS_SEED)
+    quick_metrics = []
+    pipeline = AnalysisPipeline(detector, tracker)
+    for result in pipeline.run(iter_frames(video_path, max_frames=max_frames)):
+        quick_metrics.append({
+            'frame': result['index'],
+            'vehicles': len(result['boxes']),
+            'queue_length': result['queue_length'],
+            'density': result['density']
+        })
+    return pd.DataFrame(quick_metrics)
 
-# Key Performance Indicators with enhanced enterprise styling
-st.markdown("## Key Performance Indicators")
-col1, col2, col3, col4 = st.columns(4)
-with col1:
-    st.markdown('<div class="metric-card"><h3>AI Processing Status</h3><h2>ACTIVE</h2><small>94.7% detection accuracy</small></div>', unsafe_allow_html=True)
-with col2:
-    st.markdown('<div class="metric-card"><h3>Traffic Signal Control</h3><h2>OPTIMIZED</h2><small>23% wait time reduction</small></div>', unsafe_allow_html=True)
-with col3:
-    st.markdown('<div class="metric-card"><h3>Sensor Network</h3><h2>ONLINE</h2><small>1,247 sensors active</small></div>', unsafe_allow_html=True)
-with col4:
-    st.markdown('<div class="metric-card"><h3>System Status</h3><h2>OPERATIONAL</h2><small>99.9% system uptime</small></div>', unsafe_allow_html=True)
+@st.cache_data(show_spinner=False)
+def _heatmap_grid(peak_congestion):
+    x, y = np.divmod(np.arange(100), 10)
+    density = np.random.rand(100) * peak_congestion
+    status = np.select([density > 70, density > 40], ['High', 'Medium'], 'Low')
+    return pd.DataFrame({'x': x, 'y': y, 'density': density, 'status': status})
 
-# Helper functions
 def create_traffic_heatmap_data(df):
     """Create traffic density data for visualization"""
-    intersection_data = []
-    for i in range(10):
-        for j in range(10):
-            density = np.random.rand() * df['congestion_level'].max() if not df.empty else np.random.rand() * 100
-            intersection_data.append({
-                'x': i,
-                'y': j,
-                'density': density,
-                'status': 'High' if density > 70 else 'Medium' if density > 40 else 'Low'
-            })
-    return pd.DataFrame(intersection_data)
+    # Cached per peak congestion so reruns reuse one grid instead of redrawing it
+    return _heatmap_grid(float(df['congestion_level'].max()) if not df.empty else 100.0)
+
+def vega_chart(frame, mark):
+    """Vega-Lite spec and long-form data plotting each column of ``frame`` against its index
+
+    A plain dict rendered with ``st.vega_lite_chart``: ``st.line_chart`` and
+    friends rebuild and schema-validate an Altair chart on every rerun.
+    """
+    if isinstance(frame, pd.Series):
+        frame = frame.to_frame()
+    x = str(frame.index.name or 'index')
+    wide = frame.set_axis([str(column) for column in frame.columns], axis=1)
+    data = wide.rename_axis(x).reset_index().melt(id_vars=x, var_name='series', value_name='value')
+    numeric_x = mark != 'bar' and pd.api.types.is_numeric_dtype(data[x])
+    encoding = {
+        'x': {'field': x, 'type': 'quantitative' if numeric_x else 'ordinal', 'sort': None},
+        'y': {'field': 'value', 'type': 'quantitative', 'title': None,
+              'stack': 'zero' if mark in ('bar', 'area') else None},
+        'tooltip': [{'field': x}, {'field': 'series'}, {'field': 'value', 'type': 'quantitative'}]
+    }
+    if len(wide.columns) > 1:
+        encoding['color'] = {'field': 'series', 'type': 'nominal', 'title': None, 'sort': None}
+    else:
+        encoding['y']['title'] = wide.columns[0]
+    return data, {'mark': {'type': mark, 'tooltip': True}, 'encoding': encoding}
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def analysis_charts(analysis_key, _df, _violations_df, _signals_df):
+    """Result charts of one analysis, built once per analysis key rather than on every rerun"""
+    flow = _df.set_index('frame')[['vehicles', 'congestion_level']]
+    flow.insert(2, 'efficiency', 100 - flow['congestion_level'])
+    flow_rate = flow['vehicles'] / (_df.set_index('frame')['predicted_wait'] + 1)
+    heatmap_data = create_traffic_heatmap_data(_df)
+    charts = {
+        'flow': vega_chart(flow, 'line'),
+        'density': vega_chart(heatmap_data.pivot(index='y', columns='x', values='density'), 'bar'),
+        'volume': vega_chart(flow[['vehicles']].assign(flow_rate=flow_rate), 'line'),
+        'efficiency': vega_chart(flow[['efficiency', 'congestion_level']], 'area'),
+        'signal_timing': vega_chart(_df['signal_timing'].value_counts(), 'bar'),
+        'signal_timeline': vega_chart(_signals_df.pivot_table(index='frame', columns='signal_state',
+                                                              values='frame', aggfunc='count',
+                                                              fill_value=0), 'area')
+    }
+    if not _violations_df.empty:
+        charts['violation_types'] = vega_chart(_violations_df['type'].value_counts(), 'bar')
+        trends = pd.DataFrame({'Cumulative': range(1, len(_violations_df) + 1)},
+                              index=pd.Index(_violations_df['frame'], name='Frame'))
+        charts['violation_trends'] = vega_chart(trends, 'line')
+    return charts
+
+def stage_latency_table(stages):
+    """Measured per-stage latency summaries as a display table"""
+    return pd.DataFrame([
+        {'Stage': name, 'Samples': stats['count'], 'Mean (ms)': stats['mean_ms'],
+         'p50 (ms)': stats['p50_ms'], 'p95 (ms)': stats['p95_ms'], 'p99 (ms)': stats['p99_ms'],
+         'Max (ms)': stats['max_ms']}
+        for name, stats in stages.items()
+    ])
+
+def session_instrumentation():
+    """This session's latency registry, so sessions never share timings or the on/off switch"""
+    registry = st.session_state.get('instrumentation')
+    if registry is None:
+        registry = instrumentation.Registry(enabled=instrumentation.REGISTRY.enabled)
+        st.session_state['instrumentation'] = registry
+    return registry
+
+def response_time_ms(registry):
+    """Median detection plus tracking time per frame, or None before a timed analysis"""
+    stages = registry.snapshot()
+    if 'detect' not in stages or 'track' not in stages:
+        return None
+    return stages['detect']['p50_ms'] + stages['track']['p50_ms']
+
+def render_performance_metrics(slots, registry):
+    """Fill the sidebar's performance placeholders with measured values"""
+    usage = instrumentation.process_usage()
+    detect = registry.snapshot().get('detect')
+    performance = (st.session_state.get('analysis_results') or {}).get('performance')
+    cpu, memory, latency, rate = slots
+    cpu.metric("CPU Utilization", f"{usage['cpu_percent']:.0f}%",
+               help=f"This server process, percent of one core ({usage['cpus']} available)")
+    memory.metric("Memory Usage", f"{usage['rss_mb']:.0f} MB" if usage['rss_mb'] is not None else "n/a",
+                  help="Resident memory of this server process")
+    latency.metric("Detection Latency", f"{detect['p50_ms']:.1f} ms" if detect else "n/a",
+                   help=f"Median per-frame detection time, p95 {detect['p95_ms']:.1f} ms" if detect
+                   else "Measured once a video is analysed with instrumentation on")
+    rate.metric("Processing Rate", f"{performance['fps']:.0f} fps" if performance else "n/a",
+                help="End-to-end throughput of the last analysis")
 
 def create_performance_data():
     """Create system performance metrics data"""
@@ -779,528 +888,656 @@ def create_performance_data():
         'System Reliability': 91.5
     }
 
-# File upload section with enhanced styling
-uploaded_file = st.file_uploader("📁 Upload Traffic Video for Analysis", type=['mp4'], key="main_video_uploader", help="Select a traffic video file (MP4 format) for comprehensive analysis")
+def main():
+    """Render the dashboard; Streamlit calls this on every run"""
+    # Page config for professional theme
+    st.set_page_config(
+        page_title="Traffic Management System",
+        page_icon="🚦",
+        layout="wide",
+        initial_sidebar_state="expanded"
+    )
+    st.markdown(THEME_CSS, unsafe_allow_html=True)
+    
+    # Main header with classic enterprise styling
+    st.markdown('<div class="main-header"><h1>Traffic Management System</h1><p>Enterprise-Grade Traffic Monitoring & Control Platform</p></div>', unsafe_allow_html=True)
 
-if uploaded_file is not None:
-    # Save uploaded file
-    with open("temp_traffic.mp4", "wb") as f:
-        f.write(uploaded_file.getbuffer())
-    
-    st.success("Processing initiated - analyzing video content...")
-    
-    # Progress bar
-    progress_bar = st.progress(0)
-    status_text = st.empty()
-    
-    # Run analysis
-    detector = VehicleDetector()
-    tracker = TrafficTracker()
-    frames = extract_frames("temp_traffic.mp4")
-    
-    metrics = []
-    violations = []
-    traffic_signals = []
-    
-    for frame_id, frame in enumerate(frames[:100]):
-        progress = (frame_id + 1) / min(100, len(frames))
-        progress_bar.progress(progress)
-        status_text.text(f"Analyzing frame {frame_id + 1}/{min(100, len(frames))}")
-        
-        try:
-            boxes, vehicle_data = detector.detect(frame)
-            tracks = tracker.update(frame_id, boxes, vehicle_data)
-            queue_len, density, avg_queue_speed = tracker.get_queue_metrics()
-        except:
-            boxes = detector.detect(frame)
-            if isinstance(boxes, tuple):
-                boxes = boxes[0]
-            tracks = tracker.update(frame_id, boxes)
-            queue_len, density = tracker.get_queue_metrics()[:2]
-            avg_queue_speed = 0
-        
-        # Calculate metrics
-        congestion_level = min(100, density * 10)
-        predicted_wait_time = queue_len * 2.5
-        
-        # Traffic light timing
-        if traffic_light_control:
-            if congestion_level > 70:
-                signal_timing = "EXTENDED GREEN"
-            elif congestion_level < 30:
-                signal_timing = "NORMAL CYCLE"
-            else:
-                signal_timing = "ADAPTIVE TIMING"
+    # System Status Dashboard with enhanced styling
+    st.markdown("## System Status Overview")
+    col1, col2, col3, col4, col5 = st.columns(5)
+    with col1:
+        st.markdown('<div class="system-card"><h4>AI Processing Engine</h4><h2>ONLINE</h2><small>Detection accuracy: 94.7%</small></div>', unsafe_allow_html=True)
+    with col2:
+        st.markdown('<div class="system-card"><h4>Traffic Control System</h4><h2>ACTIVE</h2><small>Adaptive signal timing enabled</small></div>', unsafe_allow_html=True)
+    with col3:
+        st.markdown('<div class="system-card"><h4>Data Processing Unit</h4><h2>RUNNING</h2><small>Real-time analysis active</small></div>', unsafe_allow_html=True)
+    with col4:
+        st.markdown('<div class="system-card"><h4>Security Module</h4><h2>SECURED</h2><small>All systems protected</small></div>', unsafe_allow_html=True)
+    with col5:
+        st.markdown('<div class="system-card"><h4>Network Infrastructure</h4><h2>CONNECTED</h2><small>99.9% uptime maintained</small></div>', unsafe_allow_html=True)
+
+    # Sidebar for system controls with enhanced professional styling
+    st.sidebar.markdown("## System Control Panel")
+    st.sidebar.markdown('<div class="status-card status-online">● All Systems Operational</div>', unsafe_allow_html=True)
+
+    # System Configuration
+    st.sidebar.markdown("### Processing Configuration")
+    ai_mode = st.sidebar.selectbox("Detection Mode", 
+        ["Standard Detection", "Enhanced Analysis", "Real-time Processing", "Batch Analysis", "Custom Configuration",
+         "Background Subtraction (MOG2)", "Background Subtraction (KNN)"])
+    detection_backend = DETECTION_BACKENDS_BY_MODE.get(ai_mode, "threshold")
+    # Detection only looks inside this rectangle; everything else in the frame is ignored
+    detection_roi = None
+    if st.sidebar.checkbox("Restrict Detection to Region", value=False,
+                           help="Detect vehicles only inside a rectangle of the frame, in pixels"):
+        roi_left, roi_right = st.sidebar.columns(2)
+        roi_x = roi_left.number_input("Region X", min_value=0, value=0, step=10)
+        roi_y = roi_right.number_input("Region Y", min_value=0, value=0, step=10)
+        roi_width = roi_left.number_input("Region Width", min_value=1, value=640, step=10)
+        roi_height = roi_right.number_input("Region Height", min_value=1, value=360, step=10)
+        detection_roi = roi_polygon(int(roi_x), int(roi_y), int(roi_width), int(roi_height))
+
+    st.sidebar.markdown("### Traffic Management Controls")
+    traffic_light_control = st.sidebar.checkbox("Adaptive Signal Control", value=True)
+    violation_detection = st.sidebar.checkbox("Violation Detection System", value=True)
+    congestion_prediction = st.sidebar.checkbox("Congestion Analysis Engine", value=True)
+    emergency_response = st.sidebar.checkbox("Emergency Response Protocol", value=True)
+
+    st.sidebar.markdown("### System Integration")
+    iot_sensors = st.sidebar.checkbox("IoT Sensor Network", value=True)
+    weather_integration = st.sidebar.checkbox("Weather Data Integration", value=True)
+    social_media_monitoring = st.sidebar.checkbox("Social Media Monitoring", value=False)
+
+    st.sidebar.markdown("### Advanced Settings")
+    ai_sensitivity = st.sidebar.slider("Detection Sensitivity Level", 0.5, 1.0, 0.85, 0.05)
+    processing_speed = st.sidebar.selectbox("Processing Mode", ["Real-time", "High Accuracy", "Balanced Performance", "Fast Processing"])
+    detection_scale = DETECTION_SCALES[processing_speed]
+    # High Accuracy solves detection-to-track matching globally instead of greedily
+    track_association = "optimal" if processing_speed == "High Accuracy" else "greedy"
+    data_retention = st.sidebar.selectbox("Data Retention Policy", ["1 Hour", "24 Hours", "7 Days", "30 Days"])
+    try:
+        default_profile = profile_mode_from_env()
+    except ValueError as e:
+        st.sidebar.warning(str(e))
+        default_profile = 'off'
+    profile_labels = [label for label, mode in PROFILE_LABELS.items() if mode in PROFILE_MODES]
+    profile_mode = PROFILE_LABELS[st.sidebar.selectbox(
+        "Profiling", profile_labels,
+        index=[PROFILE_LABELS[label] for label in profile_labels].index(default_profile),
+        help="Profile the next analysis and list its hottest functions (also TRAFFIC_PROFILE=cprofile|sampling)")]
+
+    # Measured system metrics; filled in at the end of the run so they include this run's analysis
+    st.sidebar.markdown("### Performance Metrics")
+    registry = session_instrumentation()
+    registry.enabled = st.sidebar.checkbox(
+        "Stage Timing Instrumentation", value=registry.enabled, key="instrumentation_enabled",
+        help="Per-stage latency histograms of this session's analyses: decode, detection, tracking, "
+             "violations and flow analysis")
+    performance_slots = [st.sidebar.empty() for _ in range(4)]
+
+    # Key Performance Indicators with enhanced enterprise styling
+    st.markdown("## Key Performance Indicators")
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.markdown('<div class="metric-card"><h3>AI Processing Status</h3><h2>ACTIVE</h2><small>94.7% detection accuracy</small></div>', unsafe_allow_html=True)
+    with col2:
+        st.markdown('<div class="metric-card"><h3>Traffic Signal Control</h3><h2>OPTIMIZED</h2><small>23% wait time reduction</small></div>', unsafe_allow_html=True)
+    with col3:
+        st.markdown('<div class="metric-card"><h3>Sensor Network</h3><h2>ONLINE</h2><small>1,247 sensors active</small></div>', unsafe_allow_html=True)
+    with col4:
+        st.markdown('<div class="metric-card"><h3>System Status</h3><h2>OPERATIONAL</h2><small>99.9% system uptime</small></div>', unsafe_allow_html=True)
+    
+    # File upload section with enhanced styling
+    uploaded_file = st.file_uploader("📁 Upload Traffic Video for Analysis", type=['mp4'], key="main_video_uploader", help="Select a traffic video file (MP4 format) for comprehensive analysis")
+
+    if uploaded_file is not None:
+        # Reruns and repeat uploads of the same video with the same settings reuse stored results
+        analysis_settings = {
+            'detector': {'roi': detection_roi, 'scale': detection_scale, 'backend': detection_backend,
+                         'seed': ANALYSIS_SEED},
+            'association': track_association,
+            'skip_frames': 3,
+            'max_frames': 100,
+            'traffic_light_control': traffic_light_control,
+            'violation_detection': violation_detection
+        }
+        upload = session_upload(uploaded_file)
+        analysis_key = cache_key(upload.digest, analysis_settings)
+        session_results = st.session_state.get('analysis_results')
+        # A profiled analysis always runs for real; its profile stays with the session's results
+        if (session_results is not None and session_results['key'] == analysis_key
+                and session_results['profile_mode'] == profile_mode):
+            # Widget interactions with unchanged settings render straight from session state
+            df, violations_df, signals_df = session_results['frames']
+            performance = session_results['performance']
+            profile = session_results['profile']
         else:
-            signal_timing = "MANUAL CONTROL"
+            result_cache = analysis_cache()
+            cached = result_cache.get(analysis_key) if profile_mode == 'off' else None
+            profile = None
+            if cached is None:
+                st.success("Processing initiated - analyzing video content...")
         
-        # Violation detection
-        if violation_detection and len(boxes) > 0:
-            violation_prob = np.random.random()
-            if violation_prob > 0.85:
-                violations.append({
-                    'frame': frame_id,
-                    'type': np.random.choice(['Speed Violation', 'Red Light', 'Wrong Lane']),
-                    'confidence': violation_prob * 100
-                })
+                # Progress bar
+                progress_bar = st.progress(0)
+                status_text = st.empty()
         
-        metrics.append({
-            'frame': frame_id,
-            'vehicles': len(boxes),
-            'tracks': len(tracks),
-            'queue_length': queue_len,
-            'density': density,
-            'congestion_level': congestion_level,
-            'predicted_wait': predicted_wait_time,
-            'signal_timing': signal_timing,
-            'avg_queue_speed': avg_queue_speed,
-            'timestamp': datetime.now() + timedelta(seconds=frame_id)
-        })
+                # Run analysis
+                history_size = history_size_for(upload.path, data_retention)
+                detector, tracker = analysis_engine(detection_roi, detection_scale, detection_backend,
+                                                    track_association, history_size)
+                # Frames are decoded lazily so detection starts on the first one
+                total_expected = max(1, sampled_frame_count(upload.path, max_frames=100))
+                frames_analyzed = 0
         
-        traffic_signals.append({
-            'frame': frame_id,
-            'signal_state': np.random.choice(['GREEN', 'YELLOW', 'RED'], p=[0.6, 0.1, 0.3]),
-            'timing': signal_timing
-        })
-    
-    progress_bar.progress(1.0)
-    status_text.text("Analysis complete")
-    
-    df = pd.DataFrame(metrics)
-    violations_df = pd.DataFrame(violations)
-    
-    # Traffic Analysis Dashboard with enhanced presentation
-    st.markdown("## Comprehensive Traffic Analysis Results")
-    
-    col1, col2, col3, col4, col5, col6 = st.columns(6)
-    col1.metric("Frames Analyzed", len(frames), delta="✓ Complete")
-    col2.metric("Peak Traffic Volume", df['vehicles'].max(), delta=f"+{df['vehicles'].mean():.1f} avg")
-    col3.metric("Maximum Wait Time", f"{df['predicted_wait'].max():.1f}s", delta="⚡ Optimized")
-    col4.metric("Violations Detected", len(violations), delta="🔍 Auto-detected")
-    col5.metric("Detection Accuracy", "94.7%", delta="+5.0% ↗")
-    col6.metric("Processing Speed", "1.2K fps", delta="+300 fps ⚡")
-    
-    # Analysis tabs with enhanced professional styling
-    tab1, tab2, tab3, tab4 = st.tabs([
-        "📊 Traffic Flow Analysis", "🚦 Signal Control Management", "⚠️ Violation Detection", "📈 System Performance"
-    ])
-    
-    with tab1:
-        st.subheader("Traffic Flow Analysis")
+                entry_meta = {'settings': analysis_settings}
+                with result_cache.writer(analysis_key, meta=entry_meta) as entry_dir:
+                    metrics = ColumnarSink(METRICS_SCHEMA, os.path.join(entry_dir, "metrics"))
+                    violations = ColumnarSink(VIOLATIONS_SCHEMA, os.path.join(entry_dir, "violations"))
+                    traffic_signals = ColumnarSink(SIGNALS_SCHEMA, os.path.join(entry_dir, "signals"))
+                    detections = ColumnarSink(DETECTIONS_SCHEMA, os.path.join(entry_dir, "detections"))
+                    track_log = ColumnarSink(TRACKS_SCHEMA, os.path.join(entry_dir, "tracks"))
+            
+                    # Decode, detection and tracking overlap; results still arrive in frame order
+                    pipeline = AnalysisPipeline(detector, tracker)
+                    profiler = RunProfiler(profile_mode, label=os.path.splitext(uploaded_file.name)[0])
+                    # Frames arrive in order on this thread, so one seeded generator is reproducible
+                    signal_rng = np.random.default_rng(ANALYSIS_SEED)
+                    with profiler, instrumentation.use(registry):
+                        for result in pipeline.run(iter_frames(upload.path, max_frames=100)):
+                            frame_id = result['index']
+                            frames_analyzed = frame_id + 1
+                            progress = min(1.0, frames_analyzed / total_expected)
+                            progress_bar.progress(progress)
+                            status_text.text(f"Analyzing frame {frames_analyzed}/{total_expected}")
+                
+                            boxes = result['boxes']
+                            row = frame_metrics(result, adaptive_signals=traffic_light_control)
+                            signal_timing = row['signal_timing']
+                
+                            # The frame's violation and signal draws in one call
+                            draws = signal_rng.random(3)
+                
+                            # Violation detection
+                            if violation_detection and len(boxes) > 0:
+                                violation_prob = draws[0]
+                                if violation_prob > 0.85:
+                                    violations.append({
+                                        'frame': frame_id,
+                                        'type': ['Speed Violation', 'Red Light', 'Wrong Lane'][int(draws[1] * 3)],
+                                        'confidence': violation_prob * 100
+                                    })
+                
+                            row['timestamp'] = datetime.now() + timedelta(seconds=frame_id)
+                            metrics.append(row)
+                
+                            traffic_signals.append({
+                                'frame': frame_id,
+                                'signal_state': SIGNAL_STATES[np.searchsorted(SIGNAL_THRESHOLDS, draws[2], side='right')],
+                                'timing': signal_timing
+                            })
+                
+                            detections.extend(detection_columns(frame_id, boxes, result['vehicle_data']))
+                            track_log.extend(track_columns(frame_id, result['tracks']))
+                    if profiler.enabled:
+                        profile = profiler.summary(PROFILE_TOP_N)
+            
+                    for sink in (metrics, violations, traffic_signals, detections, track_log):
+                        sink.close()
+                    stats = pipeline.stats()
+                    performance = entry_meta['performance'] = {
+                        'fps': stats['fps'], 'wall_seconds': stats['wall_seconds'],
+                        'frames': stats['track']['frames'], 'cached': False}
+                    # Read before the entry is moved into place; to_frame copies the columns
+                    df = metrics.to_frame(categorical=False)
+                    violations_df = violations.to_frame(categorical=False)
+                    signals_df = traffic_signals.to_frame(categorical=False)
         
-        col1, col2 = st.columns([2, 1])
+                progress_bar.progress(1.0)
+                status_text.text("Analysis complete")
+            else:
+                st.success("Loaded cached analysis for this video and settings")
+                performance = dict(cached.meta.get('performance') or {'fps': 0.0}, cached=True)
+                df = cached.frame("metrics")
+                violations_df = cached.frame("violations")
+                signals_df = cached.frame("signals")
+            st.session_state['analysis_results'] = {'key': analysis_key,
+                                                    'frames': (df, violations_df, signals_df),
+                                                    'performance': performance,
+                                                    'profile_mode': profile_mode, 'profile': profile}
+        frames_analyzed = len(df)
+        charts = analysis_charts(analysis_key, df, violations_df, signals_df)
+    
+        # Traffic Analysis Dashboard with enhanced presentation
+        st.markdown("## Comprehensive Traffic Analysis Results")
+    
+        col1, col2, col3, col4, col5, col6 = st.columns(6)
+        col1.metric("Frames Analyzed", frames_analyzed, delta="✓ Complete")
+        col2.metric("Peak Traffic Volume", df['vehicles'].max(), delta=f"+{df['vehicles'].mean():.1f} avg")
+        col3.metric("Maximum Wait Time", f"{df['predicted_wait'].max():.1f}s", delta="⚡ Optimized")
+        col4.metric("Violations Detected", len(violations_df), delta="🔍 Auto-detected")
+        col5.metric("Detection Accuracy", "94.7%", delta="+5.0% ↗")
+        col6.metric("Processing Speed", f"{performance['fps']:.0f} fps",
+                    help="Measured when this video was analysed" + (" (loaded from cache)" if performance['cached'] else ""))
+    
+        # Analysis tabs with enhanced professional styling
+        tab1, tab2, tab3, tab4 = st.tabs([
+            "📊 Traffic Flow Analysis", "🚦 Signal Control Management", "⚠️ Violation Detection", "📈 System Performance"
+        ])
+    
+        with tab1:
+            st.subheader("Traffic Flow Analysis")
         
-        with col1:
-            st.markdown("### Vehicle Flow Dynamics")
-            
-            # Create enhanced dataframe
-            enhanced_df = df.copy()
-            enhanced_df['efficiency'] = 100 - enhanced_df['congestion_level']
-            enhanced_df['flow_rate'] = enhanced_df['vehicles'] / (enhanced_df['predicted_wait'] + 1)
+            col1, col2 = st.columns([2, 1])
+        
+            with col1:
+                st.markdown("### Vehicle Flow Dynamics")
             
-            # Traffic flow chart
-            chart_data = enhanced_df[['vehicles', 'congestion_level', 'efficiency']].set_index(enhanced_df['frame'])
-            st.line_chart(chart_data)
+                # Traffic flow chart
+                st.vega_lite_chart(*charts['flow'])
             
-            st.markdown("### Traffic Density Analysis")
-            heatmap_data = create_traffic_heatmap_data(df)
+                st.markdown("### Traffic Density Analysis")
+                heatmap_data = create_traffic_heatmap_data(df)
             
-            # Intersection status grid
-            st.markdown("#### Intersection Status Overview")
-            grid_html = "<div style='display: grid; grid-template-columns: repeat(10, 1fr); gap: 5px; max-width: 500px;'>"
-            for _, row in heatmap_data.iterrows():
-                color = '#ef4444' if row['density'] > 70 else '#f59e0b' if row['density'] > 40 else '#10b981'
-                grid_html += f"<div style='background: {color}; padding: 8px; text-align: center; border-radius: 4px; color: white; font-size: 12px; font-weight: 500;'>{row['status']}</div>"
-            grid_html += "</div>"
-            st.markdown(grid_html, unsafe_allow_html=True)
+                # Intersection status grid
+                st.markdown("#### Intersection Status Overview")
+                grid_html = "<div style='display: grid; grid-template-columns: repeat(10, 1fr); gap: 5px; max-width: 500px;'>"
+                for _, row in heatmap_data.iterrows():
+                    color = '#ef4444' if row['density'] > 70 else '#f59e0b' if row['density'] > 40 else '#10b981'
+                    grid_html += f"<div style='background: {color}; padding: 8px; text-align: center; border-radius: 4px; color: white; font-size: 12px; font-weight: 500;'>{row['status']}</div>"
+                grid_html += "</div>"
+                st.markdown(grid_html, unsafe_allow_html=True)
             
-            # Density chart
-            pivot_data = heatmap_data.pivot(index='y', columns='x', values='density')
-            st.bar_chart(pivot_data)
+                # Density chart
+                st.vega_lite_chart(*charts['density'])
         
-        with col2:
-            st.markdown("### Current Metrics")
+            with col2:
+                st.markdown("### Current Metrics")
             
-            current_vehicles = df['vehicles'].iloc[-1] if not df.empty else 0
-            current_congestion = df['congestion_level'].iloc[-1] if not df.empty else 0
+                current_vehicles = df['vehicles'].iloc[-1] if not df.empty else 0
+                current_congestion = df['congestion_level'].iloc[-1] if not df.empty else 0
             
-            st.markdown(f"""
-            <div class="system-card">
-                <h4>Current Vehicles</h4>
-                <h2>{current_vehicles}</h2>
-                <div class="progress-bar">
-                    <div class="progress-fill progress-success" style="width: {min(current_vehicles*4, 100)}%;"></div>
+                st.markdown(f"""
+                <div class="system-card">
+                    <h4>Current Vehicles</h4>
+                    <h2>{current_vehicles}</h2>
+                    <div class="progress-bar">
+                        <div class="progress-fill progress-success" style="width: {min(current_vehicles*4, 100)}%;"></div>
+                    </div>
                 </div>
-            </div>
-            """, unsafe_allow_html=True)
+                """, unsafe_allow_html=True)
             
-            st.markdown(f"""
-            <div class="system-card">
-                <h4>Congestion Level</h4>
-                <h2>{current_congestion:.1f}%</h2>
-                <div class="progress-bar">
-                    <div class="progress-fill progress-warning" style="width: {current_congestion}%;"></div>
+                st.markdown(f"""
+                <div class="system-card">
+                    <h4>Congestion Level</h4>
+                    <h2>{current_congestion:.1f}%</h2>
+                    <div class="progress-bar">
+                        <div class="progress-fill progress-warning" style="width: {current_congestion}%;"></div>
+                    </div>
                 </div>
-            </div>
-            """, unsafe_allow_html=True)
+                """, unsafe_allow_html=True)
             
-            efficiency = 100 - current_congestion
-            st.markdown(f"""
-            <div class="system-card">
-                <h4>System Efficiency</h4>
-                <h2>{efficiency:.1f}%</h2>
-                <div class="progress-bar">
-                    <div class="progress-fill progress-success" style="width: {efficiency}%;"></div>
+                efficiency = 100 - current_congestion
+                st.markdown(f"""
+                <div class="system-card">
+                    <h4>System Efficiency</h4>
+                    <h2>{efficiency:.1f}%</h2>
+                    <div class="progress-bar">
+                        <div class="progress-fill progress-success" style="width: {efficiency}%;"></div>
+                    </div>
                 </div>
-            </div>
-            """, unsafe_allow_html=True)
+                """, unsafe_allow_html=True)
         
-        # Additional analytics
-        st.markdown("### Traffic Analytics")
-        col1, col2, col3, col4 = st.columns(4)
-        col1.metric("Flow Rate", f"{df['vehicles'].sum() / len(df):.1f} v/f", delta="Optimized")
-        col2.metric("Detection Rate", "94.7%", delta="+5.0%")
-        col3.metric("Response Time", "0.23ms", delta="-0.05ms")
-        col4.metric("System Confidence", "97.8%", delta="+2.1%")
+            # Additional analytics
+            st.markdown("### Traffic Analytics")
+            col1, col2, col3, col4 = st.columns(4)
+            col1.metric("Flow Rate", f"{df['vehicles'].sum() / len(df):.1f} v/f", delta="Optimized")
+            col2.metric("Detection Rate", "94.7%", delta="+5.0%")
+            response = response_time_ms(registry)
+            col3.metric("Response Time", f"{response:.1f} ms" if response is not None else "n/a",
+                        help="Median detection plus tracking time per frame" if response is not None
+                        else "Measured once a video is analysed with instrumentation on")
+            col4.metric("System Confidence", "97.8%", delta="+2.1%")
         
-        # Multi-dimensional analysis
-        st.markdown("### Performance Analysis")
+            # Multi-dimensional analysis
+            st.markdown("### Performance Analysis")
         
-        col1, col2 = st.columns(2)
-        with col1:
-            st.markdown("#### Traffic Volume Trends")
-            flow_chart_data = enhanced_df[['vehicles', 'flow_rate']].set_index(enhanced_df['frame'])
-            st.line_chart(flow_chart_data)
+            col1, col2 = st.columns(2)
+            with col1:
+                st.markdown("#### Traffic Volume Trends")
+                st.vega_lite_chart(*charts['volume'])
         
-        with col2:
-            st.markdown("#### Efficiency vs Congestion")
-            efficiency_data = enhanced_df[['efficiency', 'congestion_level']].set_index(enhanced_df['frame'])
-            st.area_chart(efficiency_data)
+            with col2:
+                st.markdown("#### Efficiency vs Congestion")
+                st.vega_lite_chart(*charts['efficiency'])
     
-    with tab2:
-        st.subheader("Traffic Signal Control")
+        with tab2:
+            st.subheader("Traffic Signal Control")
         
-        col1, col2 = st.columns([3, 2])
+            col1, col2 = st.columns([3, 2])
         
-        with col1:
-            st.markdown("### Signal Optimization Performance")
-            signal_counts = df['signal_timing'].value_counts()
-            st.bar_chart(signal_counts)
+            with col1:
+                st.markdown("### Signal Optimization Performance")
+                st.vega_lite_chart(*charts['signal_timing'])
             
-            st.markdown("#### Signal Efficiency Metrics")
-            efficiency_data = pd.DataFrame({
-                'Metric': ['Response Time', 'Throughput', 'Wait Reduction', 'Energy Savings'],
-                'Current': [96.8, 87.3, 78.9, 82.4],
-                'Target': [98.0, 90.0, 85.0, 88.0],
-                'Baseline': [75.2, 68.1, 45.3, 62.7]
-            })
-            st.bar_chart(efficiency_data.set_index('Metric'))
+                st.markdown("#### Signal Efficiency Metrics")
+                efficiency_data = pd.DataFrame({
+                    'Metric': ['Response Time', 'Throughput', 'Wait Reduction', 'Energy Savings'],
+                    'Current': [96.8, 87.3, 78.9, 82.4],
+                    'Target': [98.0, 90.0, 85.0, 88.0],
+                    'Baseline': [75.2, 68.1, 45.3, 62.7]
+                })
+                st.vega_lite_chart(*vega_chart(efficiency_data.set_index('Metric'), 'bar'))
             
-            # Signal state timeline
-            st.markdown("### Signal State Timeline")
-            signals_df = pd.DataFrame(traffic_signals)
-            signal_timeline = signals_df.pivot_table(
-                index='frame', 
-                columns='signal_state', 
-                values='frame', 
-                aggfunc='count', 
-                fill_value=0
-            )
-            st.area_chart(signal_timeline)
+                # Signal state timeline
+                st.markdown("### Signal State Timeline")
+                st.vega_lite_chart(*charts['signal_timeline'])
         
-        with col2:
-            st.markdown("### Signal Performance")
+            with col2:
+                st.markdown("### Signal Performance")
             
-            adaptive_cycles = len(df[df['signal_timing'] == 'ADAPTIVE TIMING'])
-            total_cycles = len(df)
-            adaptive_percentage = (adaptive_cycles / total_cycles) * 100 if total_cycles > 0 else 0
+                adaptive_cycles = len(df[df['signal_timing'] == 'ADAPTIVE TIMING'])
+                total_cycles = len(df)
+                adaptive_percentage = (adaptive_cycles / total_cycles) * 100 if total_cycles > 0 else 0
             
-            st.markdown(f"""
-            <div class="system-card">
-                <h4>Adaptive Cycles</h4>
-                <h2>{adaptive_cycles}</h2>
-                <small>{adaptive_percentage:.1f}% of total cycles</small>
-            </div>
-            """, unsafe_allow_html=True)
+                st.markdown(f"""
+                <div class="system-card">
+                    <h4>Adaptive Cycles</h4>
+                    <h2>{adaptive_cycles}</h2>
+                    <small>{adaptive_percentage:.1f}% of total cycles</small>
+                </div>
+                """, unsafe_allow_html=True)
             
-            st.markdown(f"""
-            <div class="system-card">
-                <h4>Average Cycle Time</h4>
-                <h2>47.3s</h2>
-                <small>12.7s improvement</small>
-            </div>
-            """, unsafe_allow_html=True)
+                st.markdown(f"""
+                <div class="system-card">
+                    <h4>Average Cycle Time</h4>
+                    <h2>47.3s</h2>
+                    <small>12.7s improvement</small>
+                </div>
+                """, unsafe_allow_html=True)
             
-            st.markdown(f"""
-            <div class="system-card">
-                <h4>Efficiency Score</h4>
-                <h2>94.7%</h2>
-                <small>8.3% above baseline</small>
-            </div>
-            """, unsafe_allow_html=True)
+                st.markdown(f"""
+                <div class="system-card">
+                    <h4>Efficiency Score</h4>
+                    <h2>94.7%</h2>
+                    <small>8.3% above baseline</small>
+                </div>
+                """, unsafe_allow_html=True)
             
-            # Performance metrics
-            col1, col2 = st.columns(2)
-            with col1:
-                st.metric("Signal Efficiency", "94.7%", delta="+8.3%")
-                st.metric("Wait Reduction", "23.7s", delta="-15.2s")
-            with col2:
-                st.metric("Green Wave Success", "96.2%", delta="+4.5%")
-                st.metric("Optimization Rate", "87.3%", delta="+12.1%")
+                # Performance metrics
+                col1, col2 = st.columns(2)
+                with col1:
+                    st.metric("Signal Efficiency", "94.7%", delta="+8.3%")
+                    st.metric("Wait Reduction", "23.7s", delta="-15.2s")
+                with col2:
+                    st.metric("Green Wave Success", "96.2%", delta="+4.5%")
+                    st.metric("Optimization Rate", "87.3%", delta="+12.1%")
     
-    with tab3:
-        st.subheader("Violation Detection System")
+        with tab3:
+            st.subheader("Violation Detection System")
         
-        if len(violations) > 0:
-            st.markdown('<div class="alert-warning">Traffic violations detected and logged</div>', unsafe_allow_html=True)
+            if len(violations_df) > 0:
+                st.markdown('<div class="alert-warning">Traffic violations detected and logged</div>', unsafe_allow_html=True)
             
-            col1, col2 = st.columns(2)
+                col1, col2 = st.columns(2)
             
-            with col1:
-                # Violation type distribution
-                st.markdown("#### Violation Type Distribution")
-                violation_types = violations_df['type'].value_counts()
-                st.bar_chart(violation_types)
+                with col1:
+                    # Violation type distribution
+                    st.markdown("#### Violation Type Distribution")
+                    st.vega_lite_chart(*charts['violation_types'])
                 
-                # Violation trends
-                st.markdown("#### Detection Trends")
-                violation_trends = pd.DataFrame({
-                    'Frame': violations_df['frame'] if not violations_df.empty else range(10),
-                    'Cumulative': range(1, len(violations_df) + 1) if not violations_df.empty else range(1, 11)
-                })
-                st.line_chart(violation_trends.set_index('Frame'))
+                    # Violation trends
+                    st.markdown("#### Detection Trends")
+                    st.vega_lite_chart(*charts['violation_trends'])
             
-            with col2:
-                # Violation severity
-                st.markdown("#### Severity Analysis")
-                severity_data = pd.DataFrame({
-                    'Severity': ['Critical', 'High', 'Medium', 'Low'],
-                    'Count': [np.random.randint(1, 5), np.random.randint(2, 8), 
-                             np.random.randint(5, 15), np.random.randint(10, 25)]
-                })
-                st.bar_chart(severity_data.set_index('Severity')['Count'])
+                with col2:
+                    # Violation severity
+                    st.markdown("#### Severity Analysis")
+                    severity_data = pd.DataFrame({
+                        'Severity': ['Critical', 'High', 'Medium', 'Low'],
+                        'Count': [np.random.randint(1, 5), np.random.randint(2, 8), 
+                                 np.random.randint(5, 15), np.random.randint(10, 25)]
+                    })
+                    st.vega_lite_chart(*vega_chart(severity_data.set_index('Severity')['Count'], 'bar'))
                 
-                # Time-based violations
-                st.markdown("#### Violations by Time Period")
-                time_violations = pd.DataFrame({
-                    'Hour': list(range(24)),
-                    'Speed Violations': [np.random.randint(0, 8) if 7 <= h <= 9 or 17 <= h <= 19 
-                                       else np.random.randint(0, 3) for h in range(24)],
-                    'Signal Violations': [np.random.randint(0, 5) if 7 <= h <= 9 or 17 <= h <= 19 
-                                        else np.random.randint(0, 2) for h in range(24)]
-                })
-                st.area_chart(time_violations.set_index('Hour'))
+                    # Time-based violations
+                    st.markdown("#### Violations by Time Period")
+                    time_violations = pd.DataFrame({
+                        'Hour': list(range(24)),
+                        'Speed Violations': [np.random.randint(0, 8) if 7 <= h <= 9 or 17 <= h <= 19 
+                                           else np.random.randint(0, 3) for h in range(24)],
+                        'Signal Violations': [np.random.randint(0, 5) if 7 <= h <= 9 or 17 <= h <= 19 
+                                            else np.random.randint(0, 2) for h in range(24)]
+                    })
+                    st.vega_lite_chart(*vega_chart(time_violations.set_index('Hour'), 'area'))
             
-            # Detailed violation data
-            st.markdown("### Violation Details")
-            enhanced_violations = violations_df.copy() if not violations_df.empty else pd.DataFrame()
-            if not enhanced_violations.empty:
-                enhanced_violations['severity'] = np.random.choice(['Low', 'Medium', 'High', 'Critical'], len(enhanced_violations))
-                enhanced_violations['location'] = np.random.choice(['Main St', 'Highway 101', 'School Zone', 'Downtown'], len(enhanced_violations))
+                # Detailed violation data
+                st.markdown("### Violation Details")
+                enhanced_violations = violations_df.copy() if not violations_df.empty else pd.DataFrame()
+                if not enhanced_violations.empty:
+                    enhanced_violations['severity'] = np.random.choice(['Low', 'Medium', 'High', 'Critical'], len(enhanced_violations))
+                    enhanced_violations['location'] = np.random.choice(['Main St', 'Highway 101', 'School Zone', 'Downtown'], len(enhanced_violations))
             
-            st.dataframe(enhanced_violations, use_container_width=True)
+                st.dataframe(enhanced_violations, use_container_width=True)
             
-            # Violation metrics
-            col1, col2, col3, col4 = st.columns(4)
-            col1.metric("Total Violations", len(violations))
-            col2.metric("Detection Accuracy", f"{violations_df['confidence'].mean():.1f}%" if not violations_df.empty else "95.0%")
-            col3.metric("Most Common Type", violations_df['type'].mode()[0] if not violations_df.empty else "Speed")
-            col4.metric("Response Time", "< 30s")
-        else:
-            st.markdown('<div class="alert-success">No violations detected - Excellent traffic compliance!</div>', unsafe_allow_html=True)
+                # Violation metrics
+                col1, col2, col3, col4 = st.columns(4)
+                col1.metric("Total Violations", len(violations_df))
+                col2.metric("Detection Accuracy", f"{violations_df['confidence'].mean():.1f}%" if not violations_df.empty else "95.0%")
+                col3.metric("Most Common Type", violations_df['type'].mode()[0] if not violations_df.empty else "Speed")
+                col4.metric("Response Time", "< 30s")
+            else:
+                st.markdown('<div class="alert-success">No violations detected - Excellent traffic compliance!</div>', unsafe_allow_html=True)
             
-            # Compliance metrics
-            st.markdown("### Traffic Compliance Dashboard")
+                # Compliance metrics
+                st.markdown("### Traffic Compliance Dashboard")
             
-            col1, col2 = st.columns(2)
+                col1, col2 = st.columns(2)
             
-            with col1:
-                st.markdown("#### Compliance Score Trends")
-                compliance_data = pd.DataFrame({
-                    'Day': [f'Day {i+1}' for i in range(7)],
-                    'Compliance Score': np.random.uniform(92, 99, 7),
-                    'Safety Rating': np.random.uniform(88, 96, 7)
-                })
-                st.line_chart(compliance_data.set_index('Day'))
+                with col1:
+                    st.markdown("#### Compliance Score Trends")
+                    compliance_data = pd.DataFrame({
+                        'Day': [f'Day {i+1}' for i in range(7)],
+                        'Compliance Score': np.random.uniform(92, 99, 7),
+                        'Safety Rating': np.random.uniform(88, 96, 7)
+                    })
+                    st.vega_lite_chart(*vega_chart(compliance_data.set_index('Day'), 'line'))
             
-            with col2:
-                st.markdown("#### Safety Performance")
-                safety_data = pd.DataFrame({
-                    'Metric': ['Speed Compliance', 'Signal Compliance', 'Lane Discipline', 'Following Distance'],
-                    'Score': [97.8, 98.5, 94.2, 91.7]
-                })
-                st.bar_chart(safety_data.set_index('Metric')['Score'])
+                with col2:
+                    st.markdown("#### Safety Performance")
+                    safety_data = pd.DataFrame({
+                        'Metric': ['Speed Compliance', 'Signal Compliance', 'Lane Discipline', 'Following Distance'],
+                        'Score': [97.8, 98.5, 94.2, 91.7]
+                    })
+                    st.vega_lite_chart(*vega_chart(safety_data.set_index('Metric')['Score'], 'bar'))
     
-    with tab4:
-        st.subheader("System Performance Analytics")
+        with tab4:
+            st.subheader("System Performance Analytics")
         
-        col1, col2 = st.columns([3, 2])
+            col1, col2 = st.columns([3, 2])
         
-        with col1:
-            st.markdown("### Performance Metrics")
-            performance_data = create_performance_data()
+            with col1:
+                st.markdown("### Performance Metrics")
+                performance_data = create_performance_data()
             
-            perf_df = pd.DataFrame(list(performance_data.items()), columns=['Metric', 'Score'])
-            st.bar_chart(perf_df.set_index('Metric')['Score'])
+                perf_df = pd.DataFrame(list(performance_data.items()), columns=['Metric', 'Score'])
+                st.vega_lite_chart(*vega_chart(perf_df.set_index('Metric')['Score'], 'bar'))
             
-            # System architecture info
-            st.markdown("### System Architecture")
-            st.markdown("""
-            **Processing Pipeline:**
-            - Input Layer: Video frame processing
-            - Detection Layer: Vehicle identification
-            - Tracking Layer: Multi-object tracking
-            - Analysis Layer: Traffic flow analysis
-            - Output Layer: Real-time metrics
+                # Measured latency of every instrumented stage across this session's analyses
+                st.markdown("### Stage Latency")
+                stages = registry.snapshot()
+                if stages:
+                    st.dataframe(stage_latency_table(stages).style.format(precision=3), use_container_width=True)
+                    stage = st.selectbox("Latency histogram", list(stages), key="latency_histogram_stage",
+                                         index=list(stages).index('detect') if 'detect' in stages else 0)
+                    histogram = pd.DataFrame(registry.bucket_counts(stage), columns=['Up to (ms)', 'Frames'])
+                    histogram['Up to (ms)'] = [f"{edge:.3g}" for edge in histogram['Up to (ms)']]
+                    st.vega_lite_chart(*vega_chart(histogram.set_index('Up to (ms)')['Frames'], 'bar'))
+                elif registry.enabled:
+                    st.info("No stage timings yet in this session; they are collected while videos are analysed")
+                else:
+                    st.info("Stage timing instrumentation is off; enable it in the sidebar and re-run an analysis")
             
-            **Performance Specifications:**
-            - Processing Speed: 1,200 fps
-            - Detection Accuracy: 94.7%
-            - Response Time: 0.23ms
-            - Memory Usage: 47.2MB
-            - CPU Utilization: 23%
-            """)
+                st.markdown("### Analysis Profile")
+                if profile:
+                    st.caption(f"{profile['mode']} profile of this analysis ({profile['elapsed']:.1f}s), "
+                               f"saved to {profile['path']}; idle waits are excluded")
+                    top = pd.DataFrame(profile['top'], columns=['function', 'calls', 'self_s', 'total_s', 'self_pct'])
+                    top.columns = ['Function', 'Calls', 'Self (s)', 'Total (s)', 'Self %']
+                    st.dataframe(top.style.format(precision=3), use_container_width=True)
+                    if os.path.exists(profile['path']):
+                        with open(profile['path'], 'rb') as f:
+                            st.download_button("Download profile", f.read(), file_name=os.path.basename(profile['path']),
+                                               key="download_profile")
+                else:
+                    st.caption("Choose a profiling mode in the sidebar (or set TRAFFIC_PROFILE=cprofile|sampling) "
+                               "to see where analysis time goes")
+            
+                usage = instrumentation.process_usage()
+                detect_latency = stages.get('detect', {}).get('p50_ms', 0.0)
+                memory = f"{usage['rss_mb']:.1f}MB" if usage['rss_mb'] is not None else "n/a"
+            
+                # System architecture info
+                st.markdown("### System Architecture")
+                st.markdown(f"""
+                **Processing Pipeline:**
+                - Input Layer: Video frame processing
+                - Detection Layer: Vehicle identification
+                - Tracking Layer: Multi-object tracking
+                - Analysis Layer: Traffic flow analysis
+                - Output Layer: Real-time metrics
+            
+                **Performance Specifications:**
+                - Processing Speed: {performance['fps']:.0f} fps
+                - Detection Accuracy: 94.7%
+                - Detection Latency (p50): {detect_latency:.2f}ms
+                - Memory Usage: {memory}
+                - CPU Utilization: {usage['cpu_percent']:.0f}%
+                """)
         
-        with col2:
-            st.markdown("### System Statistics")
+            with col2:
+                st.markdown("### System Statistics")
             
-            st.markdown("""
-            <div class="system-card">
-                <h4>Processing Architecture</h4>
-                <p style="color: #6b7280; margin: 0;">
-                • Input Processing: 8 channels<br>
-                • Detection Pipeline: Multi-stage<br>
-                • Tracking System: Kalman filter<br>
-                • Analysis Engine: Real-time
-                </p>
-            </div>
-            """, unsafe_allow_html=True)
+                st.markdown("""
+                <div class="system-card">
+                    <h4>Processing Architecture</h4>
+                    <p style="color: #6b7280; margin: 0;">
+                    • Input Processing: 8 channels<br>
+                    • Detection Pipeline: Multi-stage<br>
+                    • Tracking System: Kalman filter<br>
+                    • Analysis Engine: Real-time
+                    </p>
+                </div>
+                """, unsafe_allow_html=True)
             
-            st.markdown("""
-            <div class="system-card">
-                <h4>Performance Metrics</h4>
-                <p style="color: #6b7280; margin: 0;">
-                • Detection Accuracy: 94.7%<br>
-                • Processing Latency: 0.23ms<br>
-                • System Uptime: 99.9%<br>
-                • Error Rate: < 0.1%
-                </p>
-            </div>
-            """, unsafe_allow_html=True)
+                st.markdown(f"""
+                <div class="system-card">
+                    <h4>Performance Metrics</h4>
+                    <p style="color: #6b7280; margin: 0;">
+                    • Detection Accuracy: 94.7%<br>
+                    • Processing Latency: {detect_latency:.2f}ms<br>
+                    • System Uptime: 99.9%<br>
+                    • Error Rate: < 0.1%
+                    </p>
+                </div>
+                """, unsafe_allow_html=True)
             
-            st.markdown("""
-            <div class="system-card">
-                <h4>Resource Utilization</h4>
-                <p style="color: #6b7280; margin: 0;">
-                • CPU Usage: 23%<br>
-                • Memory Usage: 47.2MB<br>
-                • Network Bandwidth: 98.7%<br>
-                • Storage: 15.3GB available
-                </p>
-            </div>
-            """, unsafe_allow_html=True)
-    
-    # Comprehensive data table
-    st.subheader("Detailed Analysis Data")
-    st.dataframe(df.style.highlight_max(axis=0), use_container_width=True)
-    
-    # Sample frame display
-    st.subheader("Processed Traffic Frame")
-    if os.path.exists("sample_frame.jpg"):
-        st.image("sample_frame.jpg", caption="AI-Processed Traffic Frame with Detection Results")
-    
-    # Analysis summary
-    st.markdown("## Analysis Summary")
-    col1, col2 = st.columns(2)
+                st.markdown(f"""
+                <div class="system-card">
+                    <h4>Resource Utilization</h4>
+                    <p style="color: #6b7280; margin: 0;">
+                    • CPU Usage: {usage['cpu_percent']:.0f}%<br>
+                    • Memory Usage: {memory}<br>
+                    • Processing Time: {performance.get('wall_seconds', 0.0):.1f}s<br>
+                    • Storage: {shutil.disk_usage('.').free / 1e9:.1f}GB available
+                    </p>
+                </div>
+                """, unsafe_allow_html=True)
     
-    with col1:
-        st.markdown("### Traffic Patterns")
-        st.write(f"• Peak traffic: {df['vehicles'].max()} vehicles")
-        st.write(f"• Average congestion: {df['congestion_level'].mean():.1f}%")
-        st.write(f"• System efficiency: {(100 - df['congestion_level'].mean()):.1f}%")
+        # Comprehensive data table
+        st.subheader("Detailed Analysis Data")
+        st.dataframe(df.style.highlight_max(axis=0), use_container_width=True)
     
-    with col2:
-        st.markdown("### System Performance")
-        st.write(f"• Detection accuracy: 94.7%")
-        st.write(f"• Signal optimization: 87.3%")
-        st.write(f"• Violation detection: {len(violations)} incidents")
+        # Sample frame display
+        st.subheader("Processed Traffic Frame")
+        if os.path.exists("sample_frame.jpg"):
+            st.image("sample_frame.jpg", caption="AI-Processed Traffic Frame with Detection Results")
+    
+        # Analysis summary
+        st.markdown("## Analysis Summary")
+        col1, col2 = st.columns(2)
+    
+        with col1:
+            st.markdown("### Traffic Patterns")
+            st.write(f"• Peak traffic: {df['vehicles'].max()} vehicles")
+            st.write(f"• Average congestion: {df['congestion_level'].mean():.1f}%")
+            st.write(f"• System efficiency: {(100 - df['congestion_level'].mean()):.1f}%")
+    
+        with col2:
+            st.markdown("### System Performance")
+            st.write(f"• Detection accuracy: 94.7%")
+            st.write(f"• Signal optimization: 87.3%")
+            st.write(f"• Violation detection: {len(violations_df)} incidents")
 
-else:
-    # Demo mode when no file uploaded
-    st.markdown("## Demo Mode - Traffic Management System")
+    else:
+        # Demo mode when no file uploaded
+        st.markdown("## Demo Mode - Traffic Management System")
     
-    # Show existing traffic video if available
-    if os.path.exists("traffic.mp4"):
-        st.markdown('<div class="alert-info">Found existing traffic.mp4 - Ready for processing</div>', unsafe_allow_html=True)
+        # Show existing traffic video if available
+        if os.path.exists("traffic.mp4"):
+            st.markdown('<div class="alert-info">Found existing traffic.mp4 - Ready for processing</div>', unsafe_allow_html=True)
         
-        if st.button("Analyze Existing Video", key="analyze_existing"):
-            detector = VehicleDetector()
-            tracker = TrafficTracker()
-            frames = extract_frames("traffic.mp4")
+            if st.button("Analyze Existing Video", key="analyze_existing"):
+                # Quick analysis, cached until the file or the detection settings change
+                quick_df = quick_analysis("traffic.mp4", os.path.getmtime("traffic.mp4"), detection_roi,
+                                          detection_scale, detection_backend, track_association,
+                                          data_retention)
             
-            if frames:
-                st.success(f"Loaded {len(frames)} frames from traffic.mp4")
+                if not quick_df.empty:
+                    st.success(f"Analyzed {len(quick_df)} frames from traffic.mp4")
                 
-                # Quick analysis
-                quick_metrics = []
-                for frame_id, frame in enumerate(frames[:20]):
-                    try:
-                        boxes, vehicle_data = detector.detect(frame)
-                        tracks = tracker.update(frame_id, boxes, vehicle_data)
-                        queue_len, density, avg_speed = tracker.get_queue_metrics()
-                    except:
-                        boxes = detector.detect(frame)
-                        if isinstance(boxes, tuple):
-                            boxes = boxes[0]
-                        tracks = tracker.update(frame_id, boxes)
-                        queue_len, density = tracker.get_queue_metrics()[:2]
-                    
-                    quick_metrics.append({
-                        'frame': frame_id,
-                        'vehicles': len(boxes),
-                        'queue_length': queue_len,
-                        'density': density
-                    })
-                
-                quick_df = pd.DataFrame(quick_metrics)
-                
-                # Display results
-                col1, col2, col3, col4 = st.columns(4)
-                col1.metric("Average Vehicles", f"{quick_df['vehicles'].mean():.1f}")
-                col2.metric("Max Queue Length", quick_df['queue_length'].max())
-                col3.metric("Detection Rate", "94.7%")
-                col4.metric("Processing Speed", "Real-time")
+                    # Display results
+                    col1, col2, col3, col4 = st.columns(4)
+                    col1.metric("Average Vehicles", f"{quick_df['vehicles'].mean():.1f}")
+                    col2.metric("Max Queue Length", quick_df['queue_length'].max())
+                    col3.metric("Detection Rate", "94.7%")
+                    col4.metric("Processing Speed", "Real-time")
                 
-                st.line_chart(quick_df.set_index('frame')['vehicles'])
-                st.dataframe(quick_df)
+                    st.line_chart(quick_df.set_index('frame')['vehicles'])
+                    st.dataframe(quick_df)
     
-    # Live demo simulation
-    if st.button("Start Live Demo", key="start_demo"):
-        demo_placeholder = st.empty()
+        # Live demo simulation
+        if st.button("Start Live Demo", key="start_demo"):
+            demo_placeholder = st.empty()
         
-        for i in range(10):
-            with demo_placeholder.container():
-                col1, col2, col3 = st.columns(3)
+            for i in range(10):
+                with demo_placeholder.container():
+                    col1, col2, col3 = st.columns(3)
                 
-                with col1:
-                    vehicles = np.random.randint(5, 25)
-                    st.metric("Live Vehicle Count", vehicles, delta=np.random.randint(-3, 4))
+                    with col1:
+                        vehicles = np.random.randint(5, 25)
+                        st.metric("Live Vehicle Count", vehicles, delta=np.random.randint(-3, 4))
                 
-                with col2:
-                    congestion = np.random.randint(20, 80)
-                    st.metric("Congestion Level", f"{congestion}%", delta=f"{np.random.randint(-10, 10)}%")
+                    with col2:
+                        congestion = np.random.randint(20, 80)
+                        st.metric("Congestion Level", f"{congestion}%", delta=f"{np.random.randint(-10, 10)}%")
                 
-                with col3:
-                    efficiency = 85 + np.random.randint(-5, 10)
-                    st.metric("System Efficiency", f"{efficiency}%", delta=f"+{np.random.randint(1, 5)}%")
+                    with col3:
+                        efficiency = 85 + np.random.randint(-5, 10)
+                        st.metric("System Efficiency", f"{efficiency}%", delta=f"+{np.random.randint(1, 5)}%")
                 
-                # Real-time chart
-                demo_data = np.random.randint(5, 30, 20)
-                st.line_chart(demo_data)
+                    # Real-time chart
+                    demo_data = np.random.randint(5, 30, 20)
+                    st.line_chart(demo_data)
                 
-            time.sleep(1)
+                time.sleep(1)
+
+        # Footer with enhanced enterprise styling
+        st.markdown("---")
+        st.markdown("### Traffic Management System v2.1")
+        st.markdown("*Enterprise-Grade Traffic Monitoring & Control Platform | Powered by Advanced AI Analytics*")
+
+    render_performance_metrics(performance_slots, registry)
 
-    # Footer with enhanced enterprise styling
-    st.markdown("---")
-    st.markdown("### Traffic Management System v2.1")
-    st.markdown("*Enterprise-Grade Traffic Monitoring & Control Platform | Powered by Advanced AI Analytics*")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
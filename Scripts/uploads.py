@@ -0,0 +1,102 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import weakref
+
+UPLOAD_CHUNK = 8 * 1024 * 1024
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def _chunks(source, chunk_size):
+    """Yield memoryviews over ``source`` without copying the upload
+
+    In-memory files (Streamlit uploads are ``BytesIO``) are sliced through
+    ``getbuffer()``; other file objects are read into one reused buffer.
+    """
+    if hasattr(source, 'getbuffer'):
+        with source.getbuffer() as view:
+            for start in range(0, len(view), chunk_size):
+                yield view[start:start + chunk_size]
+        return
+    buffer = bytearray(chunk_size)
+    with memoryview(buffer) as view:
+        while True:
+            n = source.readinto(buffer)
+            if not n:
+                break
+            yield view[:n]
+
+def spool_upload(source, path, chunk_size=UPLOAD_CHUNK):
+    """Stream ``source`` to ``path`` in chunks, hashing as it goes; returns (sha256, bytes)"""
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(path, 'wb') as f:
+            for chunk in _chunks(source, chunk_size):
+                digest.update(chunk)
+                f.write(chunk)
+                size += len(chunk)
+    except BaseException:
+        # Never leave a truncated video behind for the analysis to pick up
+        _remove_quietly(path)
+        raise
+    return digest.hexdigest(), size
+
+class SpooledUpload:
+    """An uploaded video on disk plus its content hash (same as result_cache.file_digest)"""
+    __slots__ = ('upload_id', 'path', 'digest', 'size')
+
+    def __init__(self, upload_id, path, digest, size):
+        self.upload_id = upload_id
+        self.path = path
+        self.digest = digest
+        self.size = size
+
+def upload_id(uploaded_file):
+    """Identity of an upload widget value; changes when the user picks another file"""
+    file_id = getattr(uploaded_file, 'file_id', None) or id(uploaded_file)
+    return (file_id, getattr(uploaded_file, 'name', None), getattr(uploaded_file, 'size', None))
+
+class UploadStore:
+    """Private temporary directory for one session's uploaded video
+
+    Each session writes to its own ``mkdtemp`` directory, so concurrent
+    users never share a file name. Only the current upload is kept: a new
+    upload replaces the previous file. The directory is removed by
+    ``cleanup()``, when the store is garbage collected with its session,
+    or at interpreter exit, whichever comes first.
+    """
+    def __init__(self, root=None, suffix='.mp4'):
+        self.directory = tempfile.mkdtemp(prefix="traffic_upload_", dir=root)
+        self.suffix = suffix
+        self.current = None
+        self._finalizer = weakref.finalize(self, shutil.rmtree, self.directory, ignore_errors=True)
+
+    def put(self, uploaded_file, chunk_size=UPLOAD_CHUNK):
+        """Spool ``uploaded_file`` once; repeat calls for the same upload reuse the file"""
+        identity = upload_id(uploaded_file)
+        current = self.current
+        if current is not None and current.upload_id == identity and os.path.exists(current.path):
+            return current
+        self.discard()
+        fd, path = tempfile.mkstemp(suffix=self.suffix, dir=self.directory)
+        os.close(fd)
+        digest, size = spool_upload(uploaded_file, path, chunk_size)
+        self.current = SpooledUpload(identity, path, digest, size)
+        return self.current
+
+    def discard(self):
+        """Delete the current upload's file"""
+        if self.current is not None:
+            _remove_quietly(self.current.path)
+            self.current = None
+
+    def cleanup(self):
+        """Delete the store's directory now"""
+        self.current = None
+        self._finalizer()
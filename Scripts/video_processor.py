@@ -1,38 +1,135 @@
 import cv2
 import os
 import numpy as np
+import events
 
-def extract_frames(video_path, skip_frames=3):
+# Decode progress is reported once every this many source frames
+PROGRESS_EVERY = 100
+
+def probe_video(video_path):
+    """Read basic stream properties without decoding any frames"""
+    cap = cv2.VideoCapture(video_path)
+    info = {
+        'fps': cap.get(cv2.CAP_PROP_FPS),
+        'frame_count': int(cap.get(cv2.CAP_PROP_FRAME_COUNT)),
+        'width': int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        'height': int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    }
+    cap.release()
+    return info
+
+# Strides at least this long seek instead of grabbing every skipped frame
+SEEK_THRESHOLD = 30
+
+def _check_sampling(skip_frames, sample_fps):
+    """Reject strides that would never advance (or run backwards) through the video"""
+    if sample_fps is not None and sample_fps <= 0:
+        raise ValueError(f"sample_fps must be positive, got {sample_fps}")
+    if sample_fps is None and (skip_frames is None or skip_frames < 1):
+        raise ValueError(f"skip_frames must be at least 1, got {skip_frames}")
+
+def _sample_indices(skip_frames, fps, sample_fps):
+    """Yield the source frame indices to keep, in increasing order"""
+    if sample_fps is not None:
+        # Time-based sampling: one frame per 1/sample_fps seconds of video
+        step = fps / sample_fps if fps > 0 else 1.0
+        step = max(1.0, step)
+        k = 0
+        while True:
+            yield int(round(k * step))
+            k += 1
+    else:
+        index = 0
+        while True:
+            yield index
+            index += skip_frames
+
+def iter_frames(video_path, skip_frames=3, max_frames=None, sample_fps=None,
+                seek_threshold=SEEK_THRESHOLD):
+    """Lazily yield (frame_id, timestamp, frame) for every sampled frame
+
+    Skipped frames are only grabbed (demuxed) and never decoded into BGR;
+    strides of ``seek_threshold`` frames or more jump with CAP_PROP_POS_FRAMES.
+    ``sample_fps`` switches to time-based sampling (N frames per second of video).
+    """
+    _check_sampling(skip_frames, sample_fps)
     if not os.path.exists(video_path):
-        print(f"❌ Video not found: {video_path}")
-        return []
-    
+        events.emit(events.WARNING, 'video.not_found', path=video_path)
+        return
+
     cap = cv2.VideoCapture(video_path)
-    frames = []
-    frame_count = 0
+    position = 0  # index of the next frame the capture will return
+    yielded = 0
     total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
     fps = cap.get(cv2.CAP_PROP_FPS)
-    
-    print(f"📹 Video: {os.path.basename(video_path)}")
-    print(f"⏱️ FPS: {fps:.1f} | Total frames: {total_frames}")
-    
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret: break
-        if frame_count % skip_frames == 0:
-            frames.append(frame)
-        frame_count += 1
-        if frame_count % 100 == 0:
-            print(f"⏳ Processed {frame_count}/{total_frames} frames")
-    
-    cap.release()
-    print(f"✅ Extracted {len(frames)} frames")
+    can_seek = total_frames > 0 and seek_threshold is not None
+
+    events.emit(events.INFO, 'video.opened', video=os.path.basename(video_path), fps=fps,
+                total_frames=total_frames, skip_frames=skip_frames, sample_fps=sample_fps)
+
+    try:
+        for target in _sample_indices(skip_frames, fps, sample_fps):
+            if max_frames is not None and yielded >= max_frames:
+                break
+            if not cap.isOpened() or (total_frames > 0 and target >= total_frames):
+                break
+            if target < position:
+                continue
+
+            # Large strides: let the demuxer jump to the nearest keyframe
+            if can_seek and target - position >= seek_threshold:
+                if cap.set(cv2.CAP_PROP_POS_FRAMES, target):
+                    position = target
+
+            # Small strides: advance without decoding the skipped frames
+            while position < target:
+                if not cap.grab():
+                    return
+                position += 1
+                if position % PROGRESS_EVERY == 0:
+                    events.emit(events.DEBUG, 'video.progress', position=position, total_frames=total_frames)
+
+            if not cap.grab():
+                break
+            ret, frame = cap.retrieve()
+            position += 1
+            if position % PROGRESS_EVERY == 0:
+                events.emit(events.DEBUG, 'video.progress', position=position, total_frames=total_frames)
+            if not ret:
+                break
+
+            timestamp = target / fps if fps > 0 else 0.0
+            yield target, timestamp, frame
+            yielded += 1
+    finally:
+        # Runs on exhaustion and when the consumer stops early
+        cap.release()
+
+def sampled_frame_count(video_path, skip_frames=3, max_frames=None, sample_fps=None):
+    """Estimate how many frames iter_frames will yield, for progress reporting"""
+    _check_sampling(skip_frames, sample_fps)
+    info = probe_video(video_path)
+    total_frames = info['frame_count']
+    if sample_fps is not None and info['fps'] > 0:
+        step = max(1.0, info['fps'] / sample_fps)
+        expected = int(np.ceil(total_frames / step)) if total_frames > 0 else 0
+    elif sample_fps is not None:
+        expected = total_frames
+    else:
+        expected = -(-total_frames // skip_frames) if total_frames > 0 else 0
+    if max_frames is not None:
+        expected = min(expected, max_frames) if expected else max_frames
+    return expected
+
+def extract_frames(video_path, skip_frames=3, sample_fps=None):
+    frames = [frame for _, _, frame in iter_frames(video_path, skip_frames, sample_fps=sample_fps)]
+    events.emit(events.INFO, 'video.extracted', video=os.path.basename(video_path), frames=len(frames))
     return frames
 
 def save_sample_frame(frames, output_path="sample_frame.jpg"):
     if frames:
         cv2.imwrite(output_path, frames[0])
-        print(f"🖼️ Saved sample: {output_path}")
+        events.emit(events.INFO, 'video.sample_saved', path=output_path)
     return output_path
 
 if __name__ == "__main__":
@@ -14,18 +14,10 @@ scripts_dir = os.path.join(current_dir, 'Scripts')
 if scripts_dir not in sys.path:
     sys.path.insert(0, scripts_dir)
 
-# Set page config
-st.set_page_config(
-    page_title="NEXUS Traffic AI System",
-    page_icon="🚦",
-    layout="wide",
-    initial_sidebar_state="expanded"
-)
-
-# Import the main dashboard
+# Import the main dashboard once per process; Streamlit reruns only call main()
 try:
-    # Try to run the main dashboard
-    exec(open(os.path.join(scripts_dir, 'traffic_dashboard.py')).read())
+    from traffic_dashboard import main
+    main()
 except Exception as e:
     # Fallback simple dashboard
     st.title("🚦 NEXUS Traffic AI System")